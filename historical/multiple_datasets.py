@@ -1,6 +1,14 @@
+import functools
+
 from google.cloud import bigquery
 from google.oauth2 import service_account
 
+# SchemaField instances are immutable, so identical (name, type) pairs
+# across schemas can share one object instead of allocating repeats
+@functools.lru_cache(maxsize=4096)
+def _schema_field(name, field_type):
+    return bigquery.SchemaField(name, field_type)
+
 # Auth setup
 credentials = service_account.Credentials.from_service_account_file("bigquery.json")
 client = bigquery.Client(credentials=credentials, project="happyweb-340014")
@@ -144,6 +152,14 @@ products_schema = [
     {"name": "variant_image_url", "type": "STRING"},
 ]
 
+# Normalize the dict-form schemas to SchemaField once at import so
+# every consumer reuses the converted lists instead of re-converting
+order_insights_schema = [
+    _schema_field(field["name"], field["type"]) for field in order_insights_schema
+]
+products_schema = [
+    _schema_field(field["name"], field["type"]) for field in products_schema
+]
 
 
 # Loop to create the order_items_insights table
@@ -14,6 +14,7 @@ import re
 import base64
 import time
 import html
+from jinja2 import Environment
 from google.cloud import bigquery
 
 # -------------------------
@@ -194,6 +195,11 @@ st.markdown("""
     .step:last-child .step-connector {
         display: none;
     }
+    .stores-banner {
+        background-color: var(--happyweb-light); padding: 1rem; border-radius: 8px;
+        margin-bottom: 2rem; text-align: center; border: 1px solid rgba(23,212,190,0.3);
+    }
+    .stores-banner strong { color: var(--happyweb-secondary); }
     a { color: var(--happyweb-primary) !important; text-decoration: none; }
     a:hover { color: var(--happyweb-primary-dark) !important; text-decoration: underline; }
 </style>
@@ -280,6 +286,18 @@ def load_configs():
         print(f"[DEBUG] Store config file not found at {cfg_path}")
     return [], cfg_path
 
+def _write_json_atomic(path, data):
+    """Write JSON via a temp file and rename so a crash can't corrupt it"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    # Atomic on POSIX - readers see either the old or the new file,
+    # never a partial write
+    os.replace(tmp_path, path)
+
 def save_configs(configs, path):
     """Save store configurations to BigQuery (ignores path parameter)"""
     if StoreManager:
@@ -332,17 +350,22 @@ def save_configs(configs, path):
             print(f"[ERROR] Traceback: {traceback.format_exc()}", flush=True)
             # Fallback to JSON file
             if path:
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                with open(path, "w") as f:
-                    json.dump(configs, f, indent=2)
+                _write_json_atomic(path, configs)
                 print(f"[INFO] Saved to JSON file instead: {path}", flush=True)
             return False
     # Fallback to JSON file if StoreManager not available
     if path:
         print(f"[WARNING] StoreManager not available, saving to JSON: {path}", flush=True)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w") as f:
-            json.dump(configs, f, indent=2)
+        _write_json_atomic(path, configs)
+
+# Log terminal template - compiled once at import so each render is pure
+# substitution; autoescape also covers escaping raw subprocess output.
+_LOG_TMPL = Environment(autoescape=True).from_string(
+    '<div style="background-color: #1e1e1e; color: #ffffff; padding: 1rem; '
+    'border-radius: 8px; font-family: monospace; font-size: 0.85rem; '
+    'height: 400px; overflow-y: auto; white-space: pre-wrap;">'
+    '{% for line in lines %}{{ line }}\n{% endfor %}</div>'
+)
 
 def upsert_config(configs, new_cfg, key="MERCHANT"):
     """Update or insert a config in the list (for compatibility)"""
@@ -559,36 +582,25 @@ def render_stepper(current_step):
         {"number": 3, "title": "Load Data", "icon": "📥"}
     ]
     
+    # The circle/title styling lives in the shared <style> block above
+    # (.step / .step-number / .step-title); only the state class and label
+    # change per step, so each rerun ships a handful of bytes per step
+    # instead of repeating every inline style attribute
     for i, (col, step) in enumerate(zip(cols, steps)):
         with col:
             step_num = step["number"]
             if step_num < current_step:
-                st.markdown(f"""
-                <div style="text-align: center;">
-                    <div style="display: inline-block; width: 50px; height: 50px; background-color: #4caf50; color: white; border-radius: 50%; line-height: 50px; font-size: 1.5rem; font-weight: bold; margin-bottom: 0.5rem;">
-                        ✓
-                    </div>
-                    <div style="color: #4caf50; font-weight: 600;">{step["title"]}</div>
-                </div>
-                """, unsafe_allow_html=True)
+                state_cls, label = "completed", "✓"
             elif step_num == current_step:
-                st.markdown(f"""
-                <div style="text-align: center;">
-                    <div style="display: inline-block; width: 50px; height: 50px; background-color: #17D4BE; color: white; border-radius: 50%; line-height: 50px; font-size: 1.5rem; font-weight: bold; margin-bottom: 0.5rem; box-shadow: 0 0 0 4px rgba(23,212,190,0.2);">
-                        {step_num}
-                    </div>
-                    <div style="color: #17D4BE; font-weight: 600;">{step["title"]}</div>
-                </div>
-                """, unsafe_allow_html=True)
+                state_cls, label = "active", str(step_num)
             else:
-                st.markdown(f"""
-                <div style="text-align: center;">
-                    <div style="display: inline-block; width: 50px; height: 50px; background-color: #e0f5f3; color: #666; border-radius: 50%; line-height: 50px; font-size: 1.5rem; font-weight: bold; margin-bottom: 0.5rem;">
-                        {step_num}
-                    </div>
-                    <div style="color: #999; font-weight: 600;">{step["title"]}</div>
-                </div>
-                """, unsafe_allow_html=True)
+                state_cls, label = "", str(step_num)
+            st.markdown(f"""
+            <div class="step {state_cls}">
+                <div class="step-number">{label}</div>
+                <div class="step-title">{step["title"]}</div>
+            </div>
+            """, unsafe_allow_html=True)
     
     # Add a visual separator line based on current step
     if current_step == 1:
@@ -607,8 +619,8 @@ try:
     configs, _ = load_configs()
     if configs:
         st.markdown(f"""
-        <div style="background-color: var(--happyweb-light); padding: 1rem; border-radius: 8px; margin-bottom: 2rem; text-align: center; border: 1px solid rgba(23,212,190,0.3);">
-            <strong style="color: var(--happyweb-secondary);">🏪 {len(configs)} Store{'s' if len(configs) != 1 else ''} Connected</strong>
+        <div class="stores-banner">
+            <strong>🏪 {len(configs)} Store{'s' if len(configs) != 1 else ''} Connected</strong>
         </div>
         """, unsafe_allow_html=True)
 except Exception as e:
@@ -655,14 +667,16 @@ with tab1:
 
         col1, col2 = st.columns([2, 1])
         with col1:
+            # Native widgets instead of an HTML blob - Streamlit can diff
+            # these without re-parsing raw HTML on every rerun
+            st.markdown("### Ready to Load Historical Data")
             st.markdown(f"""
-            <div class="feature-card">
-                <h3>Ready to Load Historical Data</h3>
-                <p><strong>Store:</strong> {st.session_state.get('last_merchant', 'N/A')}</p>
-                <p><strong>Dataset:</strong> {st.session_state.get('last_dataset', 'N/A')}</p>
-                <p><strong>Start Date:</strong> {st.session_state.get('backfill_date', 'N/A')}</p>
-            </div>
-            """, unsafe_allow_html=True)
+**Store:** {st.session_state.get('last_merchant', 'N/A')}
+
+**Dataset:** {st.session_state.get('last_dataset', 'N/A')}
+
+**Start Date:** {st.session_state.get('backfill_date', 'N/A')}
+""")
 
             if st.button("🚀 Start Historical Data Load", type="primary", use_container_width=True):
                 if job_manager:
@@ -713,13 +727,13 @@ with tab1:
                             
                             # Show success with clear navigation
                             st.success(f"✅ Historical data load started! Job ID: {job_id}")
-                            st.markdown("""
-                            <div style="background-color: #e8fffe; padding: 1.5rem; border-radius: 8px; margin: 1rem 0; border: 2px solid var(--happyweb-primary);">
-                                <h3 style="margin: 0 0 1rem 0; color: var(--happyweb-secondary);">🎉 Pipeline Started Successfully!</h3>
-                                <p style="margin: 0.5rem 0;">Your historical data is now being loaded. This typically takes 0.5-4 hours depending on data volume.</p>
-                                <p style="margin: 0.5rem 0;"><strong>👉 Click the "Pipeline Jobs" tab above to monitor real-time progress and logs!</strong></p>
-                            </div>
-                            """, unsafe_allow_html=True)
+                            st.info("""
+🎉 **Pipeline Started Successfully!**
+
+Your historical data is now being loaded. This typically takes 0.5-4 hours depending on data volume.
+
+**👉 Click the "Pipeline Jobs" tab above to monitor real-time progress and logs!**
+""")
                             
                             # Don't rerun immediately to give user time to see the message
                             time.sleep(3)
@@ -776,11 +790,8 @@ with tab1:
                                     status_text.text("Completed!")
 
                                 # Show more logs with scrollable container
-                                log_display = "\n".join(output_text[-100:])  # Show last 100 lines instead of 12
                                 output_container.markdown(
-                                    f'<div style="background-color: #1e1e1e; color: #ffffff; padding: 1rem; '
-                                    f'border-radius: 8px; font-family: monospace; font-size: 0.85rem; '
-                                    f'height: 400px; overflow-y: auto; white-space: pre-wrap;">{log_display}</div>',
+                                    _LOG_TMPL.render(lines=output_text[-100:]),  # Show last 100 lines instead of 12
                                     unsafe_allow_html=True
                                 )
 
@@ -835,13 +846,11 @@ with tab1:
         # Check if we just started a job and show navigation prompt
         if st.session_state.get("just_started_job"):
             job_id = st.session_state.get("started_job_id", "")
-            st.markdown(f"""
-            <div style="background-color: #e8fffe; padding: 1.5rem; border-radius: 8px; margin-bottom: 2rem; border: 2px solid var(--happyweb-primary); text-align: center;">
-                <h3 style="margin: 0 0 0.5rem 0; color: var(--happyweb-secondary);">🚀 Your Pipeline is Running!</h3>
-                <p style="margin: 0.5rem 0;">Job ID: <code>{job_id[:8]}...</code></p>
-                <p style="margin: 0.5rem 0; font-size: 1.1rem;"><strong>👉 Click the "Pipeline Jobs" tab to view progress and logs</strong></p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.success(f"""
+🚀 **Your Pipeline is Running!** (Job ID: `{job_id[:8]}...`)
+
+**👉 Click the "Pipeline Jobs" tab to view progress and logs**
+""")
             # Clear the flag after showing
             del st.session_state["just_started_job"]
             if "started_job_id" in st.session_state:
@@ -849,12 +858,11 @@ with tab1:
         
         # Check if we just completed a sync load
         if st.session_state.get("just_completed_sync"):
-            st.markdown("""
-            <div style="background-color: #e8f5e9; padding: 1.5rem; border-radius: 8px; margin-bottom: 2rem; border: 2px solid #4caf50; text-align: center;">
-                <h3 style="margin: 0 0 0.5rem 0; color: #1b5e20;">✅ Historical Data Load Complete!</h3>
-                <p style="margin: 0.5rem 0; font-size: 1.1rem;"><strong>👉 Check the "Connected Stores" tab to see your data</strong></p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.success("""
+✅ **Historical Data Load Complete!**
+
+**👉 Check the "Connected Stores" tab to see your data**
+""")
             del st.session_state["just_completed_sync"]
         
         st.markdown("## 🚀 Connect New Store")
@@ -1050,7 +1058,14 @@ with tab2:
                 st.json(cfgs[0])  # Show first store config as example
         
         if cfgs:
-            table_data = []
+            # Build columns as parallel lists - pd.DataFrame on a dict of
+            # lists allocates each column in one go instead of going through
+            # the slower row-by-row from_records path
+            col_store_urls = []
+            col_datasets = []
+            col_start_dates = []
+            col_last_syncs = []
+            col_statuses = []
             for c in cfgs:
                 # Get the store's pipeline status from job_manager
                 store_status = "⚪ Not Synced"
@@ -1087,28 +1102,29 @@ with tab2:
                     except Exception as e:
                         print(f"Error getting job status for {c.get('MERCHANT')}: {e}")
                 
-                table_data.append({
-                    "Store URL": c.get("MERCHANT"),
-                    "Dataset": c.get("BIGQUERY_DATASET"),
-                    "Start Date": c.get("BACKFILL_START_DATE", "N/A"),
-                    "Last Sync": last_sync_time,
-                    "Status": store_status,
-                    "_merchant": c.get("MERCHANT"),
-                    "_token": c.get("TOKEN", "")
-                })
-            df = pd.DataFrame(table_data)
+                col_store_urls.append(c.get("MERCHANT"))
+                col_datasets.append(c.get("BIGQUERY_DATASET"))
+                col_start_dates.append(c.get("BACKFILL_START_DATE", "N/A"))
+                col_last_syncs.append(last_sync_time)
+                col_statuses.append(store_status)
 
             c1, c2, c3 = st.columns(3)
             # Count active stores based on status
-            active_count = sum(1 for row in table_data if "🟢" in row["Status"])
-            running_count = sum(1 for row in table_data if "🔄" in row["Status"])
-            
+            active_count = sum(1 for s in col_statuses if "🟢" in s)
+            running_count = sum(1 for s in col_statuses if "🔄" in s)
+
             c1.metric("Total Stores", len(cfgs))
             c2.metric("Active Stores", active_count)
             c3.metric("Running Pipelines", running_count)
 
             st.markdown("---")
-            display_df = df[["Store URL", "Dataset", "Start Date", "Last Sync", "Status"]]
+            display_df = pd.DataFrame({
+                "Store URL": col_store_urls,
+                "Dataset": col_datasets,
+                "Start Date": col_start_dates,
+                "Last Sync": col_last_syncs,
+                "Status": col_statuses,
+            })
             st.dataframe(
                 display_df,
                 use_container_width=True,
@@ -1318,8 +1334,8 @@ with tab3:
         del st.session_state["show_pipeline_notification"]
     
     if job_manager:
-        # Get recent jobs
-        recent_jobs = job_manager.get_recent_jobs(limit=20)
+        # Get recent jobs - only fetch the 10 we actually display
+        recent_jobs = job_manager.get_recent_jobs(limit=10)
         
         # Initialize Cloud Run Job Manager
         try:
@@ -1333,10 +1349,15 @@ with tab3:
         
         # Simple pipeline status table
         if recent_jobs:
-            # Create a simple table data
-            table_data = []
-            
-            for job in recent_jobs[:10]:  # Show only last 10 jobs
+            # Build table columns as parallel lists (columnar DataFrame
+            # construction, same as the Connected Stores tab)
+            col_pipelines = []
+            col_cr_jobs = []
+            col_job_statuses = []
+            col_cr_statuses = []
+            col_started = []
+
+            for job in recent_jobs:
                 # Map job status to simple status
                 status_icon = {
                     "completed": "✅",
@@ -1352,7 +1373,7 @@ with tab3:
                 
                 if cr_job_manager:
                     # Try to find Cloud Run job name from logs
-                    logs = job_manager.get_job_logs(job.job_id, limit=50)
+                    logs = job_manager.get_job_logs(job.job_id, limit=50, status=job.status)
                     for log in logs:
                         if "CLOUD_RUN_JOB_NAME:" in log.message:
                             cloud_run_job_name = log.message.split("CLOUD_RUN_JOB_NAME:")[1].strip()
@@ -1418,13 +1439,11 @@ with tab3:
                 else:
                     display_status = f"{status_icon} {job.status.title()}"
                 
-                table_data.append({
-                    "Pipeline Name": job.store_url,
-                    "Cloud Run Job": cloud_run_job_name if cloud_run_job_name else "-",
-                    "Status": display_status,
-                    "Cloud Run Status": cloud_run_status if cloud_run_status != "N/A" else "-",
-                    "Started": job.started_at.strftime("%Y-%m-%d %H:%M") if hasattr(job, 'started_at') and job.started_at else "N/A"
-                })
+                col_pipelines.append(job.store_url)
+                col_cr_jobs.append(cloud_run_job_name if cloud_run_job_name else "-")
+                col_job_statuses.append(display_status)
+                col_cr_statuses.append(cloud_run_status if cloud_run_status != "N/A" else "-")
+                col_started.append(job.started_at.strftime("%Y-%m-%d %H:%M") if hasattr(job, 'started_at') and job.started_at else "N/A")
             
             # Display simple table with controls
             st.markdown("### Pipeline Status")
@@ -1443,36 +1462,36 @@ with tab3:
                     if st.session_state.get("confirm_clear_state", 0) == 1:
                         # User confirmed, clear the data
                         try:
-                            # First, get job IDs to delete logs
+                            # Creation rows in pipeline_jobs stay 'pending'
+                            # forever - terminal state lives in the status
+                            # event table, so derive the job ids from each
+                            # job's latest status there
                             job_ids_query = f"""
-                            SELECT DISTINCT job_id 
-                            FROM `{job_manager.project_id}.{job_manager.jobs_dataset}.{job_manager.jobs_table}`
-                            WHERE status IN ('completed', 'failed', 'cancelled')
+                            SELECT job_id
+                            FROM `{job_manager.project_id}.{job_manager.jobs_dataset}.{job_manager.status_table}`
+                            GROUP BY job_id
+                            HAVING MAX_BY(status, ts) IN ('completed', 'failed', 'cancelled')
                             """
                             job_ids_result = job_manager.client.query(job_ids_query).result()
                             job_ids = [row.job_id for row in job_ids_result]
                             
                             if job_ids:
-                                # Delete associated logs first
-                                delete_logs_query = f"""
-                                DELETE FROM `{job_manager.project_id}.{job_manager.jobs_dataset}.{job_manager.logs_table}`
-                                WHERE job_id IN UNNEST(@job_ids)
-                                """
-                                
-                                log_job_config = bigquery.QueryJobConfig(
+                                delete_job_config = bigquery.QueryJobConfig(
                                     query_parameters=[
                                         bigquery.ArrayQueryParameter("job_ids", "STRING", job_ids),
                                     ]
                                 )
                                 
-                                job_manager.client.query(delete_logs_query, job_config=log_job_config).result()
-                            
-                            # Delete all completed/failed/cancelled jobs from BigQuery
-                            delete_query = f"""
-                            DELETE FROM `{job_manager.project_id}.{job_manager.jobs_dataset}.{job_manager.jobs_table}`
-                            WHERE status IN ('completed', 'failed', 'cancelled')
-                            """
-                            job_manager.client.query(delete_query).result()
+                                # Purge logs, status events, and the job
+                                # creation rows for the terminal jobs
+                                for purge_table in (job_manager.logs_table,
+                                                    job_manager.status_table,
+                                                    job_manager.jobs_table):
+                                    purge_query = f"""
+                                    DELETE FROM `{job_manager.project_id}.{job_manager.jobs_dataset}.{purge_table}`
+                                    WHERE job_id IN UNNEST(@job_ids)
+                                    """
+                                    job_manager.client.query(purge_query, job_config=delete_job_config).result()
                             
                             st.success("✅ History cleared successfully!")
                             st.session_state["confirm_clear_state"] = 0
@@ -1489,7 +1508,13 @@ with tab3:
             if st.session_state.get("confirm_clear_state", 0) == 1:
                 st.warning("⚠️ Click 'Clear History' again to confirm clearing all completed/failed jobs")
             
-            df = pd.DataFrame(table_data)
+            df = pd.DataFrame({
+                "Pipeline Name": col_pipelines,
+                "Cloud Run Job": col_cr_jobs,
+                "Status": col_job_statuses,
+                "Cloud Run Status": col_cr_statuses,
+                "Started": col_started,
+            })
             st.dataframe(
                 df,
                 use_container_width=True,
@@ -1505,7 +1530,7 @@ with tab3:
             st.info("💡 For detailed logs and error messages, please check the Cloud Run console in Google Cloud Platform.")
             
             # Add helpful links
-            if cr_job_manager and any(row.get("Cloud Run Status") != "-" for row in table_data):
+            if cr_job_manager and any(s != "-" for s in col_cr_statuses):
                 st.markdown("### 🔗 Quick Links")
                 st.markdown(f"""
                 - [View Cloud Run Jobs Console](https://console.cloud.google.com/run/jobs?project={job_manager.project_id})
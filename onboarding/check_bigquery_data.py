@@ -58,6 +58,7 @@ logs_query = f"""
 SELECT timestamp, log_level, message, component
 FROM `{project_id}.shopify_logs.pipeline_logs`
 WHERE job_id = 'bc5ae183-3cec-43c4-8102-adcb9220c204'
+AND timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 30 DAY)
 AND (log_level = 'ERROR' OR message LIKE '%error%' OR message LIKE '%fail%')
 ORDER BY timestamp DESC
 LIMIT 20
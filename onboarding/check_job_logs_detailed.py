@@ -12,58 +12,82 @@ client = bigquery.Client(project=project_id)
 
 job_id = "bc5ae183-3cec-43c4-8102-adcb9220c204"
 
-# Get all logs for this job
+# Look up the job's runtime window first so the log scan can be bounded to
+# the partitions the job actually wrote - a job's logs only exist between
+# started_at and completed_at (plus slack for late writes)
+window_query = f"""
+SELECT MIN(started_at) AS started_at, MAX(completed_at) AS completed_at
+FROM `{project_id}.shopify_logs.pipeline_jobs`
+WHERE job_id = @job_id
+"""
+
+window_config = bigquery.QueryJobConfig(
+    query_parameters=[
+        bigquery.ScalarQueryParameter("job_id", "STRING", job_id),
+    ]
+)
+
+job_window = None
+try:
+    rows = list(client.query(window_query, job_config=window_config))
+    if rows and rows[0].started_at:
+        job_window = rows[0]
+except Exception as e:
+    print(f"Could not look up job window (scanning unbounded): {e}")
+
+time_guard = ""
+window_params = []
+if job_window:
+    time_guard = """
+  AND timestamp BETWEEN @window_start
+      AND TIMESTAMP_ADD(COALESCE(@window_end, CURRENT_TIMESTAMP()), INTERVAL 1 HOUR)"""
+    window_params = [
+        bigquery.ScalarQueryParameter("window_start", "TIMESTAMP", job_window.started_at),
+        bigquery.ScalarQueryParameter("window_end", "TIMESTAMP", job_window.completed_at),
+    ]
+
+# Single pass over pipeline_logs: tag each row with its category via CASE
+# instead of issuing a second query that re-scans the same rows
 logs_query = f"""
-SELECT timestamp, log_level, message, component
+SELECT timestamp, log_level, message, component,
+  CASE
+    WHEN REGEXP_CONTAINS(message, r'\\[FETCHING\\]|\\[SUCCESS\\]|\\[WARNING\\] No|Uploaded to BigQuery')
+      THEN 'fetch'
+    ELSE 'general'
+  END AS category
 FROM `{project_id}.shopify_logs.pipeline_logs`
-WHERE job_id = '{job_id}'
-  AND (
-    message LIKE '%Fetched%'
-    OR message LIKE '%records%' 
-    OR message LIKE '%No %'
-    OR message LIKE '%WARNING%'
-    OR message LIKE '%ERROR%'
-    OR message LIKE '%Failed%'
-    OR message LIKE '%Uploaded%'
-    OR message LIKE '%success%'
-  )
+WHERE job_id = @job_id{time_guard}
+  AND REGEXP_CONTAINS(message, r'Fetched|records|No |WARNING|ERROR|Failed|Uploaded|success|\\[FETCHING\\]|\\[SUCCESS\\]')
 ORDER BY timestamp ASC
 """
 
+job_config = bigquery.QueryJobConfig(
+    query_parameters=[
+        bigquery.ScalarQueryParameter("job_id", "STRING", job_id),
+    ] + window_params
+)
+
 print(f"Checking logs for job {job_id}:")
 print("=" * 80)
 
 try:
-    logs = list(client.query(logs_query))
+    logs = list(client.query(logs_query, job_config=job_config))
     print(f"\nFound {len(logs)} relevant log entries:\n")
-    
+
     for log in logs:
         # Format timestamp
         ts = log.timestamp.strftime("%H:%M:%S")
         # Truncate long messages
         msg = log.message[:150] + "..." if len(log.message) > 150 else log.message
         print(f"[{ts}] [{log.log_level}] [{log.component}] {msg}")
-        
-    # Also check for any data fetch patterns
+
+    # Data fetch indicators come from the same result set - no second scan
+    fetch_logs = [log for log in logs if log.category == 'fetch']
     print("\n\nChecking for data fetch indicators:")
-    fetch_query = f"""
-    SELECT timestamp, message
-    FROM `{project_id}.shopify_logs.pipeline_logs`
-    WHERE job_id = '{job_id}'
-      AND (
-        message LIKE '%[FETCHING]%'
-        OR message LIKE '%[SUCCESS]%'
-        OR message LIKE '%[WARNING] No%'
-        OR message LIKE '%Uploaded to BigQuery%'
-      )
-    ORDER BY timestamp ASC
-    """
-    
-    fetch_logs = list(client.query(fetch_query))
     print(f"\nFound {len(fetch_logs)} fetch-related entries:")
     for log in fetch_logs:
         ts = log.timestamp.strftime("%H:%M:%S")
         print(f"[{ts}] {log.message}")
-        
+
 except Exception as e:
-    print(f"Error checking logs: {e}")
\ No newline at end of file
+    print(f"Error checking logs: {e}")
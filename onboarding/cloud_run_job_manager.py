@@ -7,142 +7,230 @@ Creates and manages Cloud Run Jobs for each store
 import os
 import re
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import run_v2
 from google.api_core import exceptions
+from google.api_core.retry import Retry, if_transient_error
+from google.protobuf import duration_pb2
+import logging
 import time
 
+# Lazy %s formatting defers string building until a handler actually
+# wants the record, unlike print(f"...") which always pays for it
+logger = logging.getLogger(__name__)
+if not logging.getLogger().handlers:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s %(message)s")
+
+# orjson serializes roughly an order of magnitude faster than json and
+# emits compact output by default; fall back to stdlib when unavailable
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+# Precompiled once - sanitize_job_name runs per store in bulk onboarding
+_INVALID_CHARS = re.compile(r'[^a-z0-9-]')
+_DASH_RUN = re.compile(r'-+')
+
+# Shared retry policy for Cloud Run RPCs - absorbs transient gRPC
+# UNAVAILABLE/INTERNAL errors with jittered exponential backoff so bulk
+# onboarding doesn't abort mid-batch on a blip
+_RETRY = Retry(initial=1.0, maximum=30.0, multiplier=2.0, deadline=300.0,
+               predicate=if_transient_error)
+
+# Shared gRPC clients - channel setup (TLS handshake + ADC lookup) costs
+# hundreds of ms, and managers are instantiated per Streamlit rerun
+_CLIENT_LOCK = threading.Lock()
+_JOBS_CLIENT = None
+_EXECUTIONS_CLIENT = None
+
+def _get_clients():
+    global _JOBS_CLIENT, _EXECUTIONS_CLIENT
+    with _CLIENT_LOCK:
+        if _JOBS_CLIENT is None:
+            _JOBS_CLIENT = run_v2.JobsClient()
+            _EXECUTIONS_CLIENT = run_v2.ExecutionsClient()
+        return _JOBS_CLIENT, _EXECUTIONS_CLIENT
+
 class CloudRunJobManager:
+    # Default polling cadence for status watchers. Sub-second polling
+    # multiplies API cost for no benefit on jobs that run for hours, so
+    # the default is deliberately coarse and overrides are floored at
+    # MIN_POLL_INTERVAL. Set CLOUD_RUN_POLL_INTERVAL_S to tune per deploy.
+    DEFAULT_POLL_INTERVAL = 5.0
+    MIN_POLL_INTERVAL = 1.0
+
     def __init__(self, project_id=None, region="us-central1"):
         self.project_id = project_id or os.environ.get("GCP_PROJECT_ID") or "happyweb-340014"
         self.region = region
-        self.client = run_v2.JobsClient()
-        self.executions_client = run_v2.ExecutionsClient()
+        self.client, self.executions_client = _get_clients()
         # Use the provided service account
         self.service_account = "elt-pipelines@happyweb-340014.iam.gserviceaccount.com"
-        
+        # Resource-path prefixes are static per manager - build them once
+        # instead of re-formatting in every method call
+        self._parent = f"projects/{self.project_id}/locations/{self.region}"
+        # Short names of existing jobs, loaded lazily by _load_existing_jobs;
+        # the lock keeps name reservation atomic under bulk creation threads
+        self._existing_jobs_cache = None
+        self._names_lock = threading.Lock()
+        # Static portion of the job spec, built lazily by _job_template
+        self._base_job = None
+
+    def _job_template(self):
+        """Base Job proto shared by every historical job
+
+        Everything except the per-store env vars is identical across
+        stores, so the message is constructed once and callers clone it
+        rather than rebuilding the whole tree per create.
+        """
+        if self._base_job is None:
+            self._base_job = run_v2.Job(
+                template=run_v2.ExecutionTemplate(
+                    template=run_v2.TaskTemplate(
+                        containers=[run_v2.Container(
+                            image=f"us-central1-docker.pkg.dev/{self.project_id}/cloud-run-source-deploy/shopify-pipeline:latest",
+                            resources=run_v2.ResourceRequirements(
+                                limits={"cpu": "2", "memory": "8Gi"}
+                            ),
+                            env=[
+                                run_v2.EnvVar(name="PIPELINE_TYPE", value="historical"),
+                                run_v2.EnvVar(name="GCP_PROJECT_ID", value=self.project_id),
+                            ],
+                        )],
+                        service_account=self.service_account,
+                        timeout=duration_pb2.Duration(seconds=72000),  # 20 hours
+                        max_retries=3,
+                    ),
+                    parallelism=1,  # Run one task at a time
+                )
+            )
+        return self._base_job
+
+    def _job_path(self, job_name):
+        """Full resource name for a job under this project/region"""
+        return f"{self._parent}/jobs/{job_name}"
+
     def sanitize_job_name(self, store_name):
         """Convert store name to valid Cloud Run job name"""
         # Remove .myshopify.com if present
         store_name = store_name.replace('.myshopify.com', '')
         # Replace invalid characters with hyphens
-        job_name = re.sub(r'[^a-z0-9-]', '-', store_name.lower())
+        job_name = _INVALID_CHARS.sub('-', store_name.lower())
         # Remove consecutive hyphens
-        job_name = re.sub(r'-+', '-', job_name)
+        job_name = _DASH_RUN.sub('-', job_name)
         # Trim hyphens from start/end
         job_name = job_name.strip('-')
         # Ensure it starts with 'shopify-'
         if not job_name.startswith('shopify-'):
             job_name = f'shopify-{job_name}'
+        # Cloud Run caps job names at 49 chars; truncating locally with a
+        # short hash suffix keeps the name unique and saves the failed
+        # create_job round-trip an oversized merchant would otherwise cost
+        if len(job_name) > 49:
+            digest = hashlib.blake2b(job_name.encode(), digest_size=4).hexdigest()
+            job_name = f"{job_name[:40]}-{digest}"
         return job_name
     
+    def _load_existing_jobs(self):
+        """Load the short names of all existing jobs with one list call"""
+        if self._existing_jobs_cache is None:
+            jobs = self.client.list_jobs(parent=self._parent, retry=_RETRY, timeout=60.0)
+            self._existing_jobs_cache = {job.name.rsplit('/', 1)[-1] for job in jobs}
+        return self._existing_jobs_cache
+
     def get_unique_job_name(self, base_name):
-        """Get unique job name by checking existing jobs"""
-        parent = f"projects/{self.project_id}/locations/{self.region}"
-        
-        # Try the base name first
-        job_name = base_name
-        version = 1
-        
-        while True:
-            full_name = f"{parent}/jobs/{job_name}"
-            print(f"Checking if job exists: {job_name}")
+        """Get unique job name by checking existing jobs
+
+        One list_jobs call replaces the old get_job probe per candidate
+        version - collisions are then resolved against an in-memory set
+        instead of a round-trip each.
+        """
+        with self._names_lock:
             try:
-                # Check if job exists
-                existing_job = self.client.get_job(name=full_name)
-                print(f"Job {job_name} exists, trying next version...")
-                # If we get here, job exists, try next version
-                version += 1
-                job_name = f"{base_name}-v{version}"
-            except exceptions.NotFound:
-                # Job doesn't exist, we can use this name
-                print(f"Job {job_name} does not exist, using this name")
-                return job_name
+                existing = self._load_existing_jobs()
             except Exception as e:
-                print(f"Error checking job existence: {e}")
+                logger.exception("Error listing existing jobs")
                 # If we can't check, append timestamp to ensure uniqueness
                 return f"{base_name}-{int(time.time())}"
+
+            job_name = base_name
+            version = 1
+            while job_name in existing:
+                logger.info("Job %s exists, trying next version...", job_name)
+                version += 1
+                job_name = f"{base_name}-v{version}"
+
+            logger.info("Job %s does not exist, using this name", job_name)
+            # Reserve the name locally so a later call in the same batch
+            # doesn't hand out the same one
+            existing.add(job_name)
+            return job_name
     
     def create_historical_job(self, store_config, job_id):
         """Create a Cloud Run Job for historical pipeline"""
         # Generate job name
         base_job_name = self.sanitize_job_name(store_config['MERCHANT'])
-        print(f"Base job name: {base_job_name}")
+        logger.info("Base job name: %s", base_job_name)
         
         job_name = self.get_unique_job_name(base_job_name)
-        print(f"Unique job name: {job_name}")
+        logger.info("Unique job name: %s", job_name)
         
         # Full resource name
-        parent = f"projects/{self.project_id}/locations/{self.region}"
-        full_job_name = f"{parent}/jobs/{job_name}"
+        full_job_name = self._job_path(job_name)
         
-        # Job configuration
-        job = {
-            # Don't include name in the job body for creation
-            "template": {
-                "template": {
-                    "containers": [{
-                        "image": f"us-central1-docker.pkg.dev/{self.project_id}/cloud-run-source-deploy/shopify-pipeline:latest",
-                        "resources": {
-                            "limits": {
-                                "cpu": "2",
-                                "memory": "8Gi"
-                            }
-                        },
-                        "env": [
-                            {"name": "PIPELINE_JOB_ID", "value": job_id},
-                            {"name": "TARGET_STORE", "value": store_config['MERCHANT']},
-                            {"name": "PIPELINE_TYPE", "value": "historical"},
-                            {"name": "GCP_PROJECT_ID", "value": self.project_id},
-                            # Pass store config as JSON
-                            {"name": "STORE_CONFIG_JSON", "value": json.dumps(store_config)}
-                        ]
-                    }],
-                    "service_account": self.service_account,
-                    "timeout": "72000s",  # 20 hours
-                    "max_retries": 3
-                },
-                "parallelism": 1  # Run one task at a time
-            }
-        }
+        # Clone the shared base template and patch in the per-store env -
+        # only image/resources/timeouts are static, so those protobuf
+        # messages are built once per manager instead of once per store
+        # (name is omitted from the body; create_job takes it as job_id)
+        job = run_v2.Job()
+        job._pb.CopyFrom(self._job_template()._pb)
+        job.template.template.containers[0].env.extend([
+            run_v2.EnvVar(name="PIPELINE_JOB_ID", value=job_id),
+            run_v2.EnvVar(name="TARGET_STORE", value=store_config['MERCHANT']),
+            # Pass store config as JSON - compact output, this rides in
+            # an env var on every task
+            run_v2.EnvVar(name="STORE_CONFIG_JSON", value=_dumps(store_config)),
+        ])
         
         try:
             # Create the job
             operation = self.client.create_job(
-                parent=parent,
+                parent=self._parent,
                 job=job,
-                job_id=job_name
+                job_id=job_name,
+                retry=_RETRY,
+                timeout=120.0
             )
             
-            print(f"Created Cloud Run Job: {job_name}")
-            print(f"CLOUD_RUN_JOB_NAME:{job_name}")  # Log for tracking in UI
-            
-            # Wait for job creation to complete
-            operation.result()
-            
-            # Execute the job immediately
-            print(f"Executing job: {full_job_name}")
-            execution_response = self.execute_job(full_job_name)
-            
-            if not execution_response:
-                print("WARNING: Job created but execution failed")
-                return {
-                    "success": True,  # Job was created successfully
-                    "job_name": job_name,
-                    "full_name": full_job_name,
-                    "execution_name": None,
-                    "warning": "Job created but execution failed"
-                }
-            
+            logger.info("Created Cloud Run Job: %s", job_name)
+            # Keep this one on stdout - the onboarding UI scrapes the
+            # subprocess output for this exact marker
+            print(f"CLOUD_RUN_JOB_NAME:{job_name}")
+
+            # Don't block this thread on operation.result() - chain the
+            # execution off the LRO so the caller (especially the bulk
+            # path) can start the next store's create immediately
+            operation.add_done_callback(
+                lambda op: self._execute_when_created(op, full_job_name)
+            )
+
             return {
                 "success": True,
                 "job_name": job_name,
                 "full_name": full_job_name,
-                "execution_name": execution_response.name if execution_response else None
+                "execution_name": None,
+                "execution_pending": True
             }
-            
+
         except exceptions.AlreadyExists:
             # Job already exists, just execute it
-            print(f"Job {job_name} already exists, executing it...")
+            logger.info("Job %s already exists, executing it...", job_name)
             execution_response = self.execute_job(full_job_name)
             
             return {
@@ -154,49 +242,208 @@ class CloudRunJobManager:
             }
             
         except Exception as e:
-            print(f"Error creating Cloud Run Job: {e}")
+            logger.exception("Error creating Cloud Run Job")
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    def create_historical_jobs(self, store_configs, job_ids, max_concurrency=16):
+        """Create and execute Cloud Run Jobs for many stores in parallel
+
+        Each creation is independent gRPC I/O, so a thread pool fans them
+        out; max_concurrency bounds the in-flight RPCs to stay inside API
+        quota. Results come back in the same order as store_configs, with
+        per-store failures captured as {"success": False, ...} entries
+        instead of aborting the batch.
+        """
+        # Warm the existing-jobs cache once so the worker threads don't
+        # each issue their own list_jobs call
+        try:
+            with self._names_lock:
+                self._load_existing_jobs()
+        except Exception as e:
+            logger.exception("Error preloading existing jobs")
+
+        results = [None] * len(store_configs)
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {
+                executor.submit(self.create_historical_job, config, job_id): i
+                for i, (config, job_id) in enumerate(zip(store_configs, job_ids))
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = {"success": False, "error": str(e)}
+        return results
+
+    def _execute_when_created(self, operation, full_job_name):
+        """Callback chained onto the create LRO - runs the job once created"""
+        try:
+            if operation.exception():
+                logger.error("Job creation failed for %s: %s", full_job_name, operation.exception())
+                return
+        except Exception as e:
+            logger.exception("Error checking create operation for %s", full_job_name)
+            return
+        logger.info("Executing job: %s", full_job_name)
+        self.execute_job(full_job_name)
+
+    def execute_job_async(self, job_name):
+        """Start a Cloud Run Job without waiting for the execution to settle
+
+        run_job returns an LRO whose metadata already carries the
+        execution name, so callers that just need to kick off N jobs can
+        fire these back to back and (optionally) hand the operations to
+        wait_executions afterwards.
+        """
+        return self.client.run_job(name=job_name, retry=_RETRY, timeout=120.0)
+
     def execute_job(self, job_name):
         """Execute an existing Cloud Run Job"""
         try:
-            # Run the job
-            operation = self.client.run_job(name=job_name)
-            
+            operation = self.execute_job_async(job_name)
+
             # Get the execution name
             execution = operation.metadata
-            print(f"Started job execution: {execution.name}")
-            
+            logger.info("Started job execution: %s", execution.name)
+
             return execution
-            
+
         except Exception as e:
-            print(f"Error executing job: {e}")
+            logger.exception("Error executing job")
             return None
+
+    def wait_executions(self, operations, timeout=600):
+        """Wait on many run_job operations concurrently
+
+        Waiting serially would cost N x latency; fanning the result()
+        calls over a thread pool makes the wall time ~max of the batch.
+        Returns one entry per operation, in order: the finished
+        Execution, or None if that operation failed or timed out.
+        """
+        results = [None] * len(operations)
+
+        def _wait(op):
+            return op.result(timeout=timeout)
+
+        with ThreadPoolExecutor(max_workers=min(16, max(1, len(operations)))) as executor:
+            futures = {
+                executor.submit(_wait, op): i for i, op in enumerate(operations)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    logger.exception("Error waiting for execution")
+        return results
     
-    def get_job_executions(self, job_name):
-        """Get list of executions for a job"""
+    def get_job_executions(self, job_name, limit=None):
+        """Get list of executions for a job
+
+        Pass limit to cap the page size server-side - status checks only
+        need the most recent execution, not the whole history.
+        """
         try:
-            parent = f"projects/{self.project_id}/locations/{self.region}/jobs/{job_name}"
-            executions = self.executions_client.list_executions(parent=parent)
-            return list(executions)
+            request = run_v2.ListExecutionsRequest(
+                parent=self._job_path(job_name), page_size=limit or 100
+            )
+            pager = self.executions_client.list_executions(request=request, retry=_RETRY, timeout=60.0)
+            if limit:
+                executions = []
+                for execution in pager:
+                    executions.append(execution)
+                    if len(executions) >= limit:
+                        break
+                return executions
+            return list(pager)
         except Exception as e:
-            print(f"Error listing executions: {e}")
+            logger.exception("Error listing executions")
             return []
-    
+
     def get_job_status(self, job_name):
         """Get the current status of a Cloud Run Job"""
         try:
-            # Get the latest execution
-            executions = self.get_job_executions(job_name)
+            # Only fetch the latest execution instead of the full history
+            executions = self.get_job_executions(job_name, limit=1)
             if not executions:
                 return "No executions found"
-            
+
             # Get the most recent execution
-            latest_execution = executions[0]
-            
+            return self._execution_status(executions[0])
+
+        except Exception as e:
+            logger.exception("Error getting job status")
+            return "Error checking status"
+
+    def _poll_interval(self, override=None):
+        """Resolve the polling interval: explicit override beats the
+        CLOUD_RUN_POLL_INTERVAL_S env var beats DEFAULT_POLL_INTERVAL,
+        all floored at MIN_POLL_INTERVAL."""
+        interval = override
+        if interval is None:
+            try:
+                interval = float(os.environ.get("CLOUD_RUN_POLL_INTERVAL_S", ""))
+            except ValueError:
+                interval = self.DEFAULT_POLL_INTERVAL
+        return max(float(interval), self.MIN_POLL_INTERVAL)
+
+    def watch_job(self, job_name, on_update, initial_interval=None, max_interval=30.0):
+        """Watch a job's execution and push status changes to a callback
+
+        Spawns a daemon thread that resolves the latest execution once
+        (one list_executions call), then polls that single execution with
+        exponential backoff, invoking on_update exactly once per state
+        change until a terminal state is reached. Callers get push-style
+        updates instead of each polling get_job_status, which lists
+        executions on every tick.
+
+        initial_interval defaults to DEFAULT_POLL_INTERVAL (overridable
+        via CLOUD_RUN_POLL_INTERVAL_S); tighter polling costs one RPC per
+        tick per watched job, so keep it coarse unless a session really
+        needs fast feedback.
+        """
+        initial_interval = self._poll_interval(initial_interval)
+
+        def _watch():
+            executions = self.get_job_executions(job_name, limit=1)
+            if not executions:
+                on_update("No executions found")
+                return
+
+            execution_name = executions[0].name
+            interval = initial_interval
+            last_status = None
+            while True:
+                try:
+                    execution = self.executions_client.get_execution(
+                        name=execution_name, retry=_RETRY, timeout=30.0
+                    )
+                    status = self._execution_status(execution)
+                except Exception as e:
+                    logger.exception("Error watching execution %s", execution_name)
+                    status = None
+
+                if status and status != last_status:
+                    last_status = status
+                    on_update(status)
+
+                if status in ("Completed", "Failed", "Cancelled"):
+                    return
+
+                time.sleep(interval)
+                interval = min(interval * 2, max_interval)
+
+        thread = threading.Thread(target=_watch, daemon=True)
+        thread.start()
+        return thread
+
+    def _execution_status(self, latest_execution):
+        """Map a Cloud Run execution's state to a simple status string"""
+        try:
             # Map Cloud Run execution states to simple status
             state_mapping = {
                 "EXECUTION_STATE_UNSPECIFIED": "Unknown",
@@ -220,7 +467,7 @@ class CloudRunJobManager:
                         state_name = str(state)
                 else:
                     # Fallback - check other possible fields
-                    print(f"[DEBUG] Execution object fields: {dir(latest_execution)}")
+                    logger.debug("Execution object fields: %s", dir(latest_execution))
                     state_name = "Unknown"
                 
                 # Handle numeric state values (enum values)
@@ -237,24 +484,25 @@ class CloudRunJobManager:
                 
                 return state_mapping.get(state_name, state_name)
             except Exception as e:
-                print(f"[DEBUG] Error parsing execution state: {e}")
-                print(f"[DEBUG] Execution type: {type(latest_execution)}")
+                logger.debug("Error parsing execution state: %s", e)
+                logger.debug("Execution type: %s", type(latest_execution))
                 return "Unknown"
-            
+
         except Exception as e:
-            print(f"Error getting job status: {e}")
-            return "Error checking status"
-    
+            logger.exception("Error parsing execution status")
+            return "Unknown"
+
     def delete_job(self, job_name):
         """Delete a Cloud Run Job"""
         try:
-            full_name = f"projects/{self.project_id}/locations/{self.region}/jobs/{job_name}"
-            operation = self.client.delete_job(name=full_name)
-            operation.result()
-            print(f"Deleted job: {job_name}")
+            operation = self.client.delete_job(name=self._job_path(job_name), retry=_RETRY, timeout=120.0)
+            operation.result(timeout=600)
+            logger.info("Deleted job: %s", job_name)
+            # Name list changed - reload on next use
+            self._existing_jobs_cache = None
             return True
         except Exception as e:
-            print(f"Error deleting job: {e}")
+            logger.exception("Error deleting job")
             return False
 
 # Example usage
@@ -5,43 +5,52 @@ Fix the dataset name in store configuration
 
 from google.cloud import bigquery
 import os
+import sys
 
 # Initialize client
 project_id = "happyweb-340014"
 client = bigquery.Client(project=project_id)
 
-# First, let's check the schema
 table_id = f"{project_id}.shopify_logs.store_config"
-table = client.get_table(table_id)
 
-print("Store config table schema:")
-for field in table.schema:
-    print(f"  - {field.name}: {field.field_type}")
+# The full-table dump is only needed when debugging, so it's opt-in -
+# the default path goes straight to the targeted update instead of
+# scanning every column of every row first
+if "--inspect" in sys.argv:
+    table = client.get_table(table_id)
+    print("Store config table schema:")
+    for field in table.schema:
+        print(f"  - {field.name}: {field.field_type}")
 
-# Now let's check all store configurations
-print("\nAll store configurations:")
-query = f"""
-SELECT *
-FROM `{project_id}.shopify_logs.store_config`
-"""
+    print("\nAll store configurations:")
+    query = f"""
+    SELECT merchant, bigquery_dataset, is_active
+    FROM `{table_id}`
+    """
+    # Stream rows page by page instead of buffering the whole table
+    for config in client.query(query).result(page_size=100, timeout=60):
+        print(f"\nStore: {config.merchant}")
+        print(f"  Dataset: {config.bigquery_dataset}")
+        print(f"  Active: {config.is_active}")
 
-configs = list(client.query(query))
-for config in configs:
-    print(f"\nStore: {config.merchant}")
-    print(f"  Dataset: {config.bigquery_dataset}")
-    print(f"  Active: {config.is_active}")
-    
 # Update the dataset name for sorio-romstar
-print("\n\nUpdating dataset name for sorio-romstar...")
+print("\nUpdating dataset name for sorio-romstar...")
 update_query = f"""
-UPDATE `{project_id}.shopify_logs.store_config`
-SET bigquery_dataset = 'shopify_test_sorio_v2'
-WHERE merchant = 'sorio-romstar.myshopify.com'
+UPDATE `{table_id}`
+SET bigquery_dataset = @dataset
+WHERE merchant = @merchant
 """
 
+job_config = bigquery.QueryJobConfig(
+    query_parameters=[
+        bigquery.ScalarQueryParameter("dataset", "STRING", "shopify_test_sorio_v2"),
+        bigquery.ScalarQueryParameter("merchant", "STRING", "sorio-romstar.myshopify.com"),
+    ]
+)
+
 try:
-    query_job = client.query(update_query)
+    query_job = client.query(update_query, job_config=job_config)
     query_job.result()
     print("✓ Dataset name updated successfully")
 except Exception as e:
-    print(f"Error updating: {e}")
\ No newline at end of file
+    print(f"Error updating: {e}")
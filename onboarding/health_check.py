@@ -3,56 +3,128 @@ Health check endpoints for Cloud Run monitoring
 """
 
 import os
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from google.cloud import bigquery
 from google.cloud import secretmanager
 
+# ISO timestamp cached at 1s granularity - health endpoints are hit often
+# enough that re-formatting on every call is measurable, and probes don't
+# need sub-second precision. datetime.utcnow() is also deprecated.
+_ts_cache = (0.0, "")
+
+def _utc_now_iso():
+    global _ts_cache
+    now = time.time()
+    if now - _ts_cache[0] > 1.0:
+        _ts_cache = (now, datetime.now(timezone.utc).isoformat())
+    return _ts_cache[1]
+
+# Clients are cached for the process lifetime - probes fire every few
+# seconds and rebuilding a client means a fresh channel plus ADC lookup
+_bq_client = None
+_sm_client = None
+
+def _get_bq_client():
+    global _bq_client
+    if _bq_client is None:
+        _bq_client = bigquery.Client()
+    return _bq_client
+
+def _get_sm_client():
+    global _sm_client
+    if _sm_client is None:
+        _sm_client = secretmanager.SecretManagerServiceClient()
+    return _sm_client
+
 def health_check():
     """Basic health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": _utc_now_iso(),
         "service": "shopify-pipeline-onboarding",
         "version": os.getenv("VERSION", "1.0.0")
     }
 
-def readiness_check():
-    """Readiness check - verify all dependencies are accessible"""
-    checks = {
-        "bigquery": False,
-        "secret_manager": False,
-        "environment": False
-    }
-    
+def _check_bigquery():
+    """Probe BigQuery connectivity, returning (ok, error)"""
     try:
-        # Check BigQuery connectivity
-        client = bigquery.Client()
+        client = _get_bq_client()
         list(client.list_datasets(max_results=1))
-        checks["bigquery"] = True
+        return True, None
     except Exception as e:
-        checks["bigquery_error"] = str(e)
-    
+        return False, str(e)
+
+def _check_secret_manager():
+    """Probe Secret Manager connectivity, returning (ok, error)"""
     try:
-        # Check Secret Manager connectivity
-        sm_client = secretmanager.SecretManagerServiceClient()
+        sm_client = _get_sm_client()
         project_id = os.getenv("GCP_PROJECT_ID", "")
         if project_id:
-            # Try to list secrets (doesn't need to succeed, just not fail catastrophically)
+            # Try to list secrets (doesn't need to succeed, just not fail
+            # catastrophically). next() pulls exactly one record - list()
+            # would keep paging through every secret in the project.
             parent = f"projects/{project_id}"
-            list(sm_client.list_secrets(request={"parent": parent, "page_size": 1}))
-        checks["secret_manager"] = True
+            next(iter(sm_client.list_secrets(request={"parent": parent, "page_size": 1})), None)
+        return True, None
     except Exception as e:
-        checks["secret_manager_error"] = str(e)
-    
+        return False, str(e)
+
+# Last healthy readiness result and when it was computed; probes within
+# the TTL reuse it instead of re-hitting BigQuery/Secret Manager
+_READY_TTL_SECONDS = 15.0
+_last_ready = None
+
+def readiness_check():
+    """Readiness check - verify all dependencies are accessible
+
+    A healthy result is cached for a short TTL so frequent Cloud Run
+    probes don't each issue BigQuery/Secret Manager RPCs; unhealthy
+    results are never cached, so recovery is detected immediately.
+    """
+    global _last_ready
+
+    if _last_ready and time.monotonic() - _last_ready[0] < _READY_TTL_SECONDS:
+        cached = dict(_last_ready[1])
+        cached["timestamp"] = _utc_now_iso()
+        return cached
+
+    checks = {
+        "bigquery": False,
+        "secret_manager": False,
+        "environment": False
+    }
+
+    # The two connectivity checks are independent I/O - run them in
+    # parallel so readiness latency is max(bq, sm) instead of the sum
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        bq_future = executor.submit(_check_bigquery)
+        sm_future = executor.submit(_check_secret_manager)
+        bq_ok, bq_err = bq_future.result()
+        sm_ok, sm_err = sm_future.result()
+
+    checks["bigquery"] = bq_ok
+    if bq_err:
+        checks["bigquery_error"] = bq_err
+    checks["secret_manager"] = sm_ok
+    if sm_err:
+        checks["secret_manager_error"] = sm_err
+
     # Check required environment variables
     required_env = ["GCP_PROJECT_ID"]
     checks["environment"] = all(os.getenv(var) for var in required_env)
     
     # Overall readiness
     is_ready = all(checks.get(k, False) for k in ["bigquery", "secret_manager", "environment"])
-    
-    return {
+
+    result = {
         "ready": is_ready,
         "checks": checks,
-        "timestamp": datetime.utcnow().isoformat()
-    }
\ No newline at end of file
+        "timestamp": _utc_now_iso()
+    }
+
+    if is_ready:
+        _last_ready = (time.monotonic(), result)
+
+    return result
\ No newline at end of file
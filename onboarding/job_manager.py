@@ -3,31 +3,337 @@
 Job management for parallel processing and error logging
 """
 
+import atexit
 import os
 import json
+import re
+import queue
+import selectors
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import sys
 from datetime import datetime, timezone
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 import uuid
+import itertools
 import traceback
+import requests.adapters
+from types import SimpleNamespace
+
+# orjson encodes row payloads several times faster than the stdlib json
+# the client would use internally; optional, with a full fallback below
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# One BigQuery client per project, shared across JobManager instances and
+# threads. Each client owns an urllib3 pool; per-instance clients meant
+# "Connection pool is full, discarding connection" churn and fresh TLS
+# handshakes whenever the UI thread and background loaders overlapped.
+_BQ_CLIENT_LOCK = threading.Lock()
+_BQ_CLIENTS = {}
+
+def _get_bq_client(project_id):
+    with _BQ_CLIENT_LOCK:
+        client = _BQ_CLIENTS.get(project_id)
+        if client is None:
+            client = bigquery.Client(project=project_id)
+            # Widen the pool past urllib3's default 10 connections and
+            # mount it on both the API session and the auth session
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=64, pool_maxsize=64, max_retries=3
+            )
+            client._http.mount("https://", adapter)
+            try:
+                client._http._auth_request.session.mount("https://", adapter)
+            except AttributeError:
+                pass
+            _BQ_CLIENTS[project_id] = client
+        return client
+
+# Heavyweight per-process resources shared by every JobManager for a
+# project, mirroring _BQ_CLIENTS. Streamlit re-executes the script on
+# each rerun and constructs a fresh manager every time; giving each
+# instance its own flusher thread, worker pool, and Firestore channel
+# leaked all three without bound in a long-lived UI process.
+_SHARED_LOCK = threading.Lock()
+_SHARED = {}
+
+def _get_shared_resources(project_id):
+    with _SHARED_LOCK:
+        shared = _SHARED.get(project_id)
+        if shared is None:
+            try:
+                log_tail = FirestoreLogTail(project_id)
+            except Exception as e:
+                print(f"Firestore log tail unavailable, using BigQuery only: {e}")
+                log_tail = None
+            shared = SimpleNamespace(
+                log_tail=log_tail,
+                executor=ThreadPoolExecutor(
+                    max_workers=int(os.getenv("JOB_WORKERS", "8")),
+                    thread_name_prefix="jobmgr",
+                ),
+                running_futures={},
+                log_queue=queue.Queue(maxsize=JobManager.LOG_QUEUE_MAX),
+                log_flusher=None,
+            )
+            _SHARED[project_id] = shared
+        return shared
+
+class FirestoreLogTail:
+    """Hot buffer holding the most recent log lines for each job.
+
+    BigQuery stays the durable log store, but it is a poor live-tail
+    backend: every read is a billed query with ~300ms+ latency, and
+    streamed rows can lag in the streaming buffer. While a job is running
+    the UI reads the tail from a single Firestore document instead; the
+    document is deleted once the job reaches a terminal status.
+    """
+
+    MAX_LINES = 500
+
+    def __init__(self, project_id=None):
+        from google.cloud import firestore
+        self._firestore = firestore
+        self.client = firestore.Client(project=project_id)
+        self._collection = self.client.collection("pipeline_log_tails")
+
+    def append(self, job_id, record):
+        """Append a log record dict to the job's tail document"""
+        self.append_many(job_id, [record])
+
+    def append_many(self, job_id, records):
+        """Append log records, keeping only the newest MAX_LINES.
+
+        The trim happens on write: an ArrayUnion would grow the document
+        without bound until it hit Firestore's 1 MiB document cap, after
+        which every append for the job fails and the tail freezes. One
+        read plus a bounded overwrite per flush keeps the document size
+        flat for arbitrarily long jobs.
+        """
+        doc_ref = self._collection.document(job_id)
+        snapshot = doc_ref.get()
+        lines = snapshot.to_dict().get("lines", []) if snapshot.exists else []
+        lines.extend(records)
+        doc_ref.set({"lines": lines[-self.MAX_LINES:]})
+
+    def tail(self, job_id, limit=MAX_LINES):
+        """Return the last `limit` log records for a job (oldest first)"""
+        snapshot = self._collection.document(job_id).get()
+        if not snapshot.exists:
+            return []
+        lines = snapshot.to_dict().get("lines", [])
+        return lines[-limit:]
+
+    def clear(self, job_id):
+        """Drop the tail document (called when a job finishes)"""
+        self._collection.document(job_id).delete()
+
+# Log timestamps cached at ~1ms granularity - isoformat() per line is a
+# measurable share of the hot log path, and lines produced closer
+# together than that can share a timestamp without affecting ordering
+# any more than microsecond ties already do
+_log_ts_cache = (0.0, "")
+
+def _log_timestamp():
+    global _log_ts_cache
+    now = time.time()
+    if now - _log_ts_cache[0] > 0.001:
+        _log_ts_cache = (now, datetime.fromtimestamp(now, tz=timezone.utc).isoformat())
+    return _log_ts_cache[1]
+
+# Single-pass log classifiers for the subprocess capture loop. The old
+# chain of seven `in`/.lower() substring tests ran per stdout line; one
+# precompiled case-insensitive scan in C replaces all of them.
+_LEVEL_RE = re.compile(r'(?P<ERROR>error)|(?P<WARNING>warning)', re.IGNORECASE)
+_COMPONENT_RE = re.compile(
+    r'(?P<customers>customer)|(?P<order>order)|(?P<products>product)|(?P<items>items)',
+    re.IGNORECASE,
+)
+
+def _classify_line(line):
+    """Return (log_level, component) for one line of pipeline output"""
+    m = _LEVEL_RE.search(line)
+    log_level = m.lastgroup if m else "INFO"
+
+    hits = {m.lastgroup for m in _COMPONENT_RE.finditer(line)}
+    if 'customers' in hits:
+        component = "customers"
+    elif 'order' in hits and 'items' in hits:
+        component = "order_items"
+    elif 'order' in hits:
+        component = "orders"
+    elif 'products' in hits:
+        component = "products"
+    else:
+        component = "main"
+    return log_level, component
+
+# Caps concurrent insertAll calls across all JobManager threads so the
+# shared pool above can never be saturated
+_INSERT_SEMAPHORE = threading.BoundedSemaphore(32)
+
+# Datasets whose management tables are known to exist - repeat
+# JobManager constructors in the same process skip the ensure RPCs
+_INIT_LOCK = threading.Lock()
+_INIT_CACHE = set()
 
 class JobManager:
+    # How long a get_active_jobs result may be served from memory. The UI
+    # polls every few seconds and the answer only changes on a state
+    # transition, which bumps _jobs_version and invalidates immediately.
+    ACTIVE_JOBS_TTL = 5.0
+
+    # Log micro-batcher thresholds: a flush happens when either the row
+    # count or the age of the oldest queued row is hit, whichever first
+    LOG_FLUSH_ROWS = 500
+    LOG_FLUSH_SECONDS = 0.25
+    LOG_QUEUE_MAX = 50_000
+
     def __init__(self, project_id=None):
         self.project_id = project_id or os.environ.get("GCP_PROJECT_ID")
-        self.client = bigquery.Client(project=self.project_id)
+        self.client = _get_bq_client(self.project_id)
         # Centralized dataset for all pipeline management across stores
         self.jobs_dataset = "shopify_logs"
         self.jobs_table = "pipeline_jobs"
         self.logs_table = "pipeline_logs"
-        
+        self.status_table = "pipeline_job_status"
+        self.jobs_table_id = f"{self.project_id}.{self.jobs_dataset}.{self.jobs_table}"
+        self.logs_table_id = f"{self.project_id}.{self.jobs_dataset}.{self.logs_table}"
+        self.status_table_id = f"{self.project_id}.{self.jobs_dataset}.{self.status_table}"
+
+        # Hot dashboard/lookup SQL is built once here - these methods run
+        # on every UI refresh, and identical query text also hits
+        # BigQuery's result cache more reliably than re-formatted strings
+        self._build_queries()
+
+        # Flusher thread, worker pool, log queue, and the Firestore tail
+        # are process-wide singletons - see _get_shared_resources
+        shared = _get_shared_resources(self.project_id)
+        self.log_tail = shared.log_tail
+
         # Initialize tables
         self._ensure_management_tables()
+
+        # Cheap per-row log ids: one uuid per manager plus a counter,
+        # instead of a 16-byte urandom read and hex format per line
+        self._worker_id = uuid.uuid4().hex[:12]
+        self._log_seq = itertools.count()
+
+        # (timestamp, version, rows) for the active-jobs TTL cache
+        self._active_jobs_cache = None
+        self._jobs_version = 0
+
+        # Bounded worker pool for background historical loads - raw
+        # threads per request meant an unbounded OS-thread/subprocess
+        # ceiling under onboarding bursts. Shared so Streamlit reruns
+        # keep seeing the futures of loads started by earlier instances.
+        self._executor = shared.executor
+        self._running_futures = shared.running_futures
+
+        # Log rows are queued here and flushed in batches by a daemon
+        # thread - the subprocess capture loop used to pay one streaming
+        # insert per stdout line, which made log capture network bound.
+        # The thread is started once per process, bound to the first
+        # manager; later instances target the same project and tables.
+        self._log_queue = shared.log_queue
+        with _SHARED_LOCK:
+            if shared.log_flusher is None:
+                shared.log_flusher = threading.Thread(
+                    target=self._drain_log_queue, daemon=True
+                )
+                shared.log_flusher.start()
+                # The flusher is a daemon thread, so interpreter shutdown
+                # kills it mid-wait without draining - in the pipeline
+                # container that deterministically drops the last batch
+                # window of rows, i.e. the final completion/error lines.
+                # Flush synchronously at exit so they reach BigQuery.
+                atexit.register(self.flush_logs)
+        self._log_flusher = shared.log_flusher
+
+    def _drain_log_queue(self):
+        """Background loop: batch queued log rows and insert per batch"""
+        while True:
+            rows = []
+            try:
+                rows.append(self._log_queue.get(timeout=5))
+            except queue.Empty:
+                continue
+            # Collect more rows until the size or age threshold trips
+            deadline = time.monotonic() + self.LOG_FLUSH_SECONDS
+            while len(rows) < self.LOG_FLUSH_ROWS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._log_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush_log_rows(rows)
+
+    def _flush_log_rows(self, rows):
+        if not rows:
+            return
+        # Mirror to the hot tail first - it's what the live UI reads -
+        # grouping rows so each job costs one Firestore write per flush
+        if self.log_tail:
+            by_job = {}
+            for row in rows:
+                by_job.setdefault(row["job_id"], []).append(row)
+            for job_id, records in by_job.items():
+                try:
+                    self.log_tail.append_many(job_id, records)
+                except Exception as e:
+                    print(f"Failed to append to log tail: {e}")
+        try:
+            errors = self._insert_rows(self.logs_table_id, rows)
+            if errors:
+                print(f"Failed to log {len(errors)} message(s): {errors}")
+        except Exception as e:
+            print(f"Failed to flush log batch: {e}")
+
+    def flush_logs(self):
+        """Synchronously flush whatever is queued right now"""
+        rows = []
+        while True:
+            try:
+                rows.append(self._log_queue.get_nowait())
+            except queue.Empty:
+                break
+        self._flush_log_rows(rows)
     
     def _ensure_management_tables(self):
         """Create management dataset and tables if they don't exist"""
+        cache_key = (self.project_id, self.jobs_dataset)
+        with _INIT_LOCK:
+            if cache_key in _INIT_CACHE:
+                return
+
+            # One INFORMATION_SCHEMA probe replaces the dataset + three
+            # table create calls when everything is already in place
+            try:
+                probe = f"""
+                SELECT table_name
+                FROM `{self.project_id}.{self.jobs_dataset}`.INFORMATION_SCHEMA.TABLES
+                WHERE table_name IN ('{self.jobs_table}', '{self.logs_table}', '{self.status_table}')
+                """
+                found = {row.table_name for row in self.client.query(probe).result()}
+                if found >= {self.jobs_table, self.logs_table, self.status_table}:
+                    _INIT_CACHE.add(cache_key)
+                    return
+            except Exception:
+                # Dataset missing or probe failed - fall through to creates
+                pass
+
+            self._create_management_tables()
+            _INIT_CACHE.add(cache_key)
+
+    def _create_management_tables(self):
         # Create dataset
         dataset_id = f"{self.project_id}.{self.jobs_dataset}"
         dataset = bigquery.Dataset(dataset_id)
@@ -56,6 +362,14 @@ class JobManager:
         ]
         
         jobs_table = bigquery.Table(jobs_table_id, schema=jobs_schema)
+        # Partition by day and cluster on job_id so per-job lookups and
+        # the first-record MV refresh stop scaling with total history
+        # (applies to newly created tables; existing deployments can
+        # migrate with CREATE TABLE ... PARTITION BY ... AS SELECT *)
+        jobs_table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY, field="started_at"
+        )
+        jobs_table.clustering_fields = ["job_id", "store_url", "status"]
         jobs_table = self.client.create_table(jobs_table, exists_ok=True)
         
         # Create logs table
@@ -73,8 +387,251 @@ class JobManager:
         ]
         
         logs_table = bigquery.Table(logs_table_id, schema=logs_schema)
+        # Day partitioning plus (job_id, log_level) clustering lets the
+        # per-job log queries prune to a couple of partitions and blocks
+        # instead of scanning the whole log history (applies to newly
+        # created tables; existing deployments keep their layout)
+        logs_table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY, field="timestamp"
+        )
+        logs_table.clustering_fields = ["job_id", "log_level"]
         logs_table = self.client.create_table(logs_table, exists_ok=True)
+
+        # Narrow status-event table. Status changes used to be inserted as
+        # whole pipeline_jobs rows with blank store/dataset fields plus a
+        # point-lookup SELECT to backfill them; events here carry only what
+        # actually changes. Clustering by job_id makes the per-job lookups
+        # touch a single block, and day partitioning keeps scans bounded.
+        status_schema = [
+            bigquery.SchemaField("job_id", "STRING", mode="REQUIRED"),
+            bigquery.SchemaField("status", "STRING", mode="REQUIRED"),
+            bigquery.SchemaField("ts", "TIMESTAMP", mode="REQUIRED"),
+            bigquery.SchemaField("error_message", "STRING", mode="NULLABLE"),
+            bigquery.SchemaField("records_processed", "INTEGER", mode="NULLABLE"),
+        ]
+        status_table = bigquery.Table(self.status_table_id, schema=status_schema)
+        status_table.clustering_fields = ["job_id"]
+        status_table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY, field="ts"
+        )
+        status_table = self.client.create_table(status_table, exists_ok=True)
+
+        self._ensure_materialized_views()
+
+    def _ensure_materialized_views(self):
+        """Create the materialized views the dashboard queries read from.
+
+        The UI re-ran the same full-table CTEs (first record, latest
+        record, per-job error counts) on every refresh. These MVs
+        precompute the aggregations and refresh incrementally, so the
+        dashboard queries scan MV deltas instead of the whole tables.
+        Only MV-legal aggregates are used - the latest row is recovered
+        by joining MAX(started_at) back to the base table, since
+        ARRAY_AGG/ROW_NUMBER aren't allowed in materialized views.
+        """
+        prefix = f"{self.project_id}.{self.jobs_dataset}"
+        mv_statements = [
+            f"""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS `{prefix}.mv_job_first_record`
+            OPTIONS(enable_refresh=true, refresh_interval_minutes=5) AS
+            SELECT
+                job_id,
+                MIN(started_at) as original_started_at,
+                MIN(store_url) as original_store_url,
+                MIN(dataset_name) as original_dataset_name,
+                MIN(job_type) as original_job_type
+            FROM `{prefix}.{self.jobs_table}`
+            WHERE job_type != 'status_update' OR job_type IS NULL
+            GROUP BY job_id
+            """,
+            f"""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS `{prefix}.mv_status_latest_ts`
+            OPTIONS(enable_refresh=true, refresh_interval_minutes=5) AS
+            SELECT job_id, MAX(ts) as latest_ts
+            FROM `{prefix}.{self.status_table}`
+            GROUP BY job_id
+            """,
+            f"""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS `{prefix}.mv_log_error_counts`
+            OPTIONS(enable_refresh=true, refresh_interval_minutes=5) AS
+            SELECT job_id, log_level, COUNT(*) as log_count
+            FROM `{prefix}.{self.logs_table}`
+            GROUP BY job_id, log_level
+            """,
+            # Logical view that classifies level/component at read time,
+            # so rows written without pre-classification (or by other
+            # producers) still come back enriched
+            f"""
+            CREATE VIEW IF NOT EXISTS `{prefix}.v_pipeline_logs_enriched` AS
+            SELECT
+                log_id, job_id, timestamp, message, store_url,
+                is_error, error_type,
+                COALESCE(log_level, CASE
+                    WHEN REGEXP_CONTAINS(message, r'(?i)error') THEN 'ERROR'
+                    WHEN REGEXP_CONTAINS(message, r'(?i)warning') THEN 'WARNING'
+                    ELSE 'INFO' END) as log_level,
+                COALESCE(component, CASE
+                    WHEN REGEXP_CONTAINS(LOWER(message), 'customer') THEN 'customers'
+                    WHEN REGEXP_CONTAINS(LOWER(message), 'order')
+                         AND REGEXP_CONTAINS(LOWER(message), 'items') THEN 'order_items'
+                    WHEN REGEXP_CONTAINS(LOWER(message), 'order') THEN 'orders'
+                    WHEN REGEXP_CONTAINS(LOWER(message), 'product') THEN 'products'
+                    ELSE 'main' END) as component
+            FROM `{prefix}.{self.logs_table}`
+            """,
+        ]
+        for statement in mv_statements:
+            try:
+                self.client.query(statement).result()
+            except Exception as e:
+                print(f"Could not ensure materialized view: {e}")
     
+
+    def _build_queries(self):
+        """Precompute the SQL for the per-refresh query methods"""
+        prefix = f"{self.project_id}.{self.jobs_dataset}"
+
+        self._sql_active_jobs = f"""
+        SELECT
+            fr.job_id,
+            fr.original_store_url as store_url,
+            fr.original_dataset_name as dataset_name,
+            fr.original_job_type as job_type,
+            COALESCE(se.status, 'pending') as status,
+            fr.original_started_at as started_at,
+            TIMESTAMP_DIFF(CURRENT_TIMESTAMP(), fr.original_started_at, SECOND) as running_seconds
+        FROM `{prefix}.mv_job_first_record` fr
+        -- Latest status event per job: join MAX(ts) back to the event table
+        LEFT JOIN `{prefix}.mv_status_latest_ts` st
+            ON fr.job_id = st.job_id
+        LEFT JOIN `{prefix}.{self.status_table}` se
+            ON se.job_id = st.job_id AND se.ts = st.latest_ts
+        WHERE
+            -- Only show active statuses (no event yet means still pending)
+            COALESCE(se.status, 'pending') IN ('pending', 'running')
+            -- Only recent jobs (last 24 hours)
+            AND fr.original_started_at >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
+            -- Ensure we have valid data
+            AND fr.original_store_url IS NOT NULL
+            AND fr.original_dataset_name IS NOT NULL
+        ORDER BY fr.original_started_at DESC
+        """
+
+        self._sql_job_logs = f"""
+        SELECT timestamp, log_level, message, component
+        FROM `{prefix}.v_pipeline_logs_enriched`
+        WHERE job_id = @job_id
+        ORDER BY timestamp DESC
+        LIMIT @limit
+        """
+
+        self._sql_error_summary = f"""
+        SELECT
+            COUNTIF(log_level = 'ERROR') as error_count,
+            COUNTIF(log_level = 'WARNING') as warning_count,
+            ARRAY_AGG(
+                STRUCT(timestamp, message, component)
+                ORDER BY timestamp DESC
+                LIMIT 10
+            ) as recent_errors
+        FROM `{prefix}.v_pipeline_logs_enriched`
+        WHERE job_id = @job_id
+        AND log_level IN ('ERROR', 'WARNING')
+        -- Partition filter: jobs run for hours, not days, so two days of
+        -- partitions covers any live job while pruning the rest
+        AND timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 2 DAY)
+        """
+
+        recent_jobs_tmpl = f"""
+        SELECT
+            f.job_id,
+            f.original_store_url as store_url,
+            f.original_dataset_name as dataset_name,
+            f.original_job_type as job_type,
+            COALESCE(se.status, 'pending') as status,
+            f.original_started_at as started_at,
+            CASE WHEN se.status IN ('completed', 'failed', 'cancelled')
+                 THEN se.ts END as completed_at,
+            se.error_message,
+            CASE WHEN se.status IN ('completed', 'failed')
+                 THEN TIMESTAMP_DIFF(se.ts, f.original_started_at, SECOND)
+                 END as duration_seconds,
+            se.records_processed,
+            COALESCE(ec.log_count, 0) as error_count
+        FROM `{prefix}.mv_job_first_record` f
+        -- Latest status event per job: join MAX(ts) back to the event table
+        LEFT JOIN `{prefix}.mv_status_latest_ts` st
+            ON f.job_id = st.job_id
+        LEFT JOIN `{prefix}.{self.status_table}` se
+            ON se.job_id = st.job_id AND se.ts = st.latest_ts
+        LEFT JOIN `{prefix}.mv_log_error_counts` ec
+            ON ec.job_id = f.job_id AND ec.log_level = 'ERROR'
+        WHERE f.original_store_url IS NOT NULL AND f.original_dataset_name IS NOT NULL
+        {{status_clause}}
+        ORDER BY f.original_started_at DESC
+        LIMIT @limit
+        """
+        self._sql_recent_jobs = recent_jobs_tmpl.format(status_clause="")
+        self._sql_recent_jobs_filtered = recent_jobs_tmpl.format(
+            status_clause="AND COALESCE(se.status, 'pending') IN UNNEST(@statuses)"
+        )
+
+        # MAX_BY is a one-pass aggregate - no sort operator like
+        # ORDER BY ts DESC LIMIT 1 would plan
+        self._sql_latest_status = f"""
+        SELECT MAX_BY(status, ts) as status
+        FROM `{prefix}.{self.status_table}`
+        WHERE job_id = @job_id
+        """
+
+        self._sql_debug_status = f"""
+        SELECT job_id, status, started_at, job_type
+        FROM `{prefix}.{self.jobs_table}`
+        WHERE job_id = @job_id
+        UNION ALL
+        SELECT job_id, status, ts as started_at, 'status_update' as job_type
+        FROM `{prefix}.{self.status_table}`
+        WHERE job_id = @job_id
+        ORDER BY started_at DESC
+        """
+
+    def _insert_rows(self, table_id, rows, row_ids=None):
+        """Write rows to a table in a single RPC.
+
+        Every row write funnels through here so callers can hand over a
+        whole batch (one insertAll per batch, not per row) and so the
+        transport lives in exactly one place if we ever swap streaming
+        inserts for the Storage Write API.
+
+        With orjson available the insertAll body is serialized up front
+        and posted over the client's authorized session, skipping the
+        stdlib-json encode inside insert_rows_json - the dominant client
+        CPU cost when the batcher flushes hundreds of rows.
+        """
+        with _INSERT_SEMAPHORE:
+            if orjson is None:
+                return self.client.insert_rows_json(table_id, rows, row_ids=row_ids)
+            try:
+                project, dataset, table = table_id.split(".")
+                entries = []
+                for i, row in enumerate(rows):
+                    entry = {"json": row}
+                    if row_ids:
+                        entry["insertId"] = row_ids[i]
+                    entries.append(entry)
+                response = self.client._http.post(
+                    "https://bigquery.googleapis.com/bigquery/v2/"
+                    f"projects/{project}/datasets/{dataset}/tables/{table}/insertAll",
+                    data=orjson.dumps({"rows": entries}),
+                    headers={"Content-Type": "application/json"},
+                    timeout=60,
+                )
+                response.raise_for_status()
+                return response.json().get("insertErrors", [])
+            except Exception as e:
+                print(f"Raw insertAll failed, falling back to client: {e}")
+                return self.client.insert_rows_json(table_id, rows, row_ids=row_ids)
+
     def create_job(self, store_url, dataset_name, job_type="historical_load", created_by=None):
         """Create a new job record"""
         job_id = str(uuid.uuid4())
@@ -88,249 +645,169 @@ class JobManager:
             "created_by": created_by or "system"
         }
         
-        table_id = f"{self.project_id}.{self.jobs_dataset}.{self.jobs_table}"
-        errors = self.client.insert_rows_json(table_id, [job_data])
-        
+        errors = self._insert_rows(self.jobs_table_id, [job_data], row_ids=[job_id])
+
         if errors:
             raise Exception(f"Failed to create job: {errors}")
+
+        self._jobs_version += 1  # invalidate the active-jobs cache
         
         return job_id
     
     def update_job_status(self, job_id, status, error_message=None, records_processed=None):
-        """Update job status - using insert instead of update to avoid streaming buffer issues"""
-        # Instead of UPDATE, we'll insert a new status record
-        # The queries will use the latest status based on timestamp
-        from datetime import datetime, timezone
-        
+        """Record a status change - insert-only to avoid streaming buffer issues.
+
+        Events go to the narrow pipeline_job_status table; store/dataset
+        fields live on the immutable creation record in pipeline_jobs, so
+        there's no pre-insert lookup to backfill them and readers derive
+        completion time and duration from the event timestamps.
+        """
         status_data = {
             "job_id": job_id,
-            "store_url": "",  # Will be filled from original job
-            "dataset_name": "",  # Will be filled from original job
-            "job_type": "status_update",
             "status": status,
-            "started_at": datetime.now(timezone.utc).isoformat(),
-            "completed_at": datetime.now(timezone.utc).isoformat() if status in ['completed', 'failed'] else None,
+            "ts": datetime.now(timezone.utc).isoformat(),
             "error_message": error_message,
             "records_processed": records_processed,
-            "created_by": "system"
         }
-        
-        # Get original job info to fill missing fields
-        try:
-            query = f"""
-            SELECT store_url, dataset_name, job_type, started_at
-            FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-            WHERE job_id = @job_id
-            ORDER BY started_at DESC
-            LIMIT 1
-            """
-            
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ScalarQueryParameter("job_id", "STRING", job_id),
-                ]
-            )
-            
-            result = list(self.client.query(query, job_config=job_config))
-            if result:
-                original = result[0]
-                status_data["store_url"] = getattr(original, 'store_url', '')
-                status_data["dataset_name"] = getattr(original, 'dataset_name', '')
-                if hasattr(original, 'started_at') and original.started_at:
-                    status_data["started_at"] = original.started_at.isoformat()
-                    
-                    # Calculate duration if completed
-                    if status in ['completed', 'failed']:
-                        duration = (datetime.now(timezone.utc) - original.started_at).total_seconds()
-                        status_data["duration_seconds"] = int(duration)
-        except Exception as e:
-            print(f"Warning: Could not get original job info: {e}")
-        
-        # Insert the status update as a new record
-        table_id = f"{self.project_id}.{self.jobs_dataset}.{self.jobs_table}"
-        errors = self.client.insert_rows_json(table_id, [status_data])
-        
+
+        # Deterministic insertId: a retried insert after a transport
+        # error dedupes server-side instead of double-writing the event
+        row_id = f"{job_id}:{status}:{int(time.time() * 1000)}"
+        errors = self._insert_rows(self.status_table_id, [status_data], row_ids=[row_id])
+
         if errors:
             print(f"Failed to update job status: {errors}")
+        else:
+            self._jobs_version += 1  # invalidate the active-jobs cache
+
+        # Terminal status: drop the hot tail, readers go to BigQuery now
+        if status in ('completed', 'failed', 'cancelled') and self.log_tail:
+            try:
+                self.log_tail.clear(job_id)
+            except Exception as e:
+                print(f"Failed to clear log tail: {e}")
     
     def log_message(self, job_id, log_level, message, store_url=None, component=None):
         """Log a message for a job"""
         log_data = {
-            "log_id": str(uuid.uuid4()),
+            "log_id": f"{self._worker_id}-{next(self._log_seq)}",
             "job_id": job_id,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": _log_timestamp(),
             "log_level": log_level,
             "message": message[:1000],  # Truncate long messages
             "store_url": store_url,
             "component": component
         }
-        
-        table_id = f"{self.project_id}.{self.jobs_dataset}.{self.logs_table}"
-        errors = self.client.insert_rows_json(table_id, [log_data])
-        
-        if errors:
-            print(f"Failed to log message: {errors}")
+
+        # Enqueue for the batch flusher - O(1), no network on this path.
+        # The flusher also mirrors rows to the Firestore tail, so a slow
+        # backend can never block the thread draining subprocess stdout.
+        # When the queue is full, errors still block their way in; lower
+        # severities drop the oldest queued row instead.
+        try:
+            self._log_queue.put_nowait(log_data)
+        except queue.Full:
+            if log_level == "ERROR":
+                self._log_queue.put(log_data)
+            else:
+                try:
+                    self._log_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self._log_queue.put_nowait(log_data)
+                except queue.Full:
+                    pass
     
     def get_active_jobs(self):
         """Get all active jobs - improved to handle status updates better"""
-        query = f"""
-        WITH job_timeline AS (
-            -- Get all job records with timestamp ordering
-            SELECT *,
-                   ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY started_at DESC) as rn
-            FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-        ),
-        latest_status AS (
-            -- Get the most recent status for each job
-            SELECT 
-                job_id, 
-                status, 
-                store_url, 
-                dataset_name, 
-                job_type,
-                started_at
-            FROM job_timeline
-            WHERE rn = 1
-        ),
-        first_record AS (
-            -- Get the original job start time (exclude status updates)
-            SELECT 
-                job_id, 
-                MIN(started_at) as original_started_at,
-                MIN(store_url) as original_store_url,
-                MIN(dataset_name) as original_dataset_name
-            FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-            WHERE job_type != 'status_update' OR job_type IS NULL
-            GROUP BY job_id
-        )
-        SELECT DISTINCT
-            fr.job_id,
-            COALESCE(ls.store_url, fr.original_store_url) as store_url,
-            COALESCE(ls.dataset_name, fr.original_dataset_name) as dataset_name,
-            ls.job_type,
-            ls.status,
-            fr.original_started_at as started_at,
-            TIMESTAMP_DIFF(CURRENT_TIMESTAMP(), fr.original_started_at, SECOND) as running_seconds
-        FROM first_record fr
-        INNER JOIN latest_status ls ON fr.job_id = ls.job_id
-        WHERE 
-            -- Only show active statuses
-            ls.status IN ('pending', 'running')
-            -- Double-check: ensure not in terminal states
-            AND ls.status NOT IN ('cancelled', 'completed', 'failed')
-            -- Only recent jobs (last 24 hours)
-            AND fr.original_started_at >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
-            -- Ensure we have valid data
-            AND fr.original_store_url IS NOT NULL
-            AND fr.original_dataset_name IS NOT NULL
-        ORDER BY fr.original_started_at DESC
-        """
-        
+        cached = self._active_jobs_cache
+        if (cached
+                and cached[1] == self._jobs_version
+                and time.monotonic() - cached[0] < self.ACTIVE_JOBS_TTL):
+            return cached[2]
+
         try:
-            return list(self.client.query(query))
+            rows = list(self.client.query(self._sql_active_jobs))
         except Exception as e:
             print(f"[ERROR] Failed to get active jobs: {e}")
             return []
+
+        self._active_jobs_cache = (time.monotonic(), self._jobs_version, rows)
+        return rows
     
-    def get_job_logs(self, job_id, limit=100):
-        """Get logs for a specific job"""
-        query = f"""
-        SELECT timestamp, log_level, message, component
-        FROM `{self.project_id}.{self.jobs_dataset}.{self.logs_table}`
-        WHERE job_id = @job_id
-        ORDER BY timestamp DESC
-        LIMIT @limit
+    def get_job_logs(self, job_id, limit=100, status=None):
+        """Get logs for a specific job.
+
+        For jobs still running (pass the known status to enable this),
+        logs are served from the Firestore tail buffer instead of a billed
+        BigQuery query; completed jobs always read from BigQuery.
         """
-        
+        if status in ('pending', 'running') and self.log_tail:
+            try:
+                lines = self.log_tail.tail(job_id, limit=limit)
+                if lines:
+                    # Newest first, matching the BigQuery ORDER BY below
+                    return [
+                        SimpleNamespace(
+                            timestamp=datetime.fromisoformat(rec["timestamp"]),
+                            log_level=rec.get("log_level"),
+                            message=rec.get("message"),
+                            component=rec.get("component"),
+                        )
+                        for rec in reversed(lines)
+                    ]
+            except Exception as e:
+                print(f"Log tail read failed, falling back to BigQuery: {e}")
+
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("job_id", "STRING", job_id),
                 bigquery.ScalarQueryParameter("limit", "INTEGER", limit),
             ]
         )
-        
-        return list(self.client.query(query, job_config=job_config))
+
+        # Fetch the whole (small) result in one right-sized page instead
+        # of the default pagination
+        return list(
+            self.client.query(self._sql_job_logs, job_config=job_config).result(
+                page_size=limit, max_results=limit
+            )
+        )
     
     def get_job_error_summary(self, job_id):
         """Get error summary for a specific job"""
-        query = f"""
-        SELECT 
-            COUNT(CASE WHEN log_level = 'ERROR' THEN 1 END) as error_count,
-            COUNT(CASE WHEN log_level = 'WARNING' THEN 1 END) as warning_count,
-            ARRAY_AGG(
-                STRUCT(timestamp, message, component)
-                ORDER BY timestamp DESC
-                LIMIT 10
-            ) as recent_errors
-        FROM `{self.project_id}.{self.jobs_dataset}.{self.logs_table}`
-        WHERE job_id = @job_id
-        AND log_level IN ('ERROR', 'WARNING')
-        """
-        
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("job_id", "STRING", job_id)
             ]
         )
-        
-        results = list(self.client.query(query, job_config=job_config))
+
+        results = list(self.client.query(self._sql_error_summary, job_config=job_config))
         if results:
             return results[0]
         return None
     
-    def get_recent_jobs(self, limit=20):
-        """Get recent jobs with summary"""
-        query = f"""
-        WITH job_timeline AS (
-            -- Get all records for each job
-            SELECT *,
-                   ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY started_at DESC) as rn
-            FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-        ),
-        latest_record AS (
-            -- Get the most recent record for each job (for latest status)
-            SELECT job_id, status, error_message, completed_at, duration_seconds, records_processed
-            FROM job_timeline
-            WHERE rn = 1
-        ),
-        first_record AS (
-            -- Get the first record for each job (for original data)
-            -- Exclude status updates to get the actual job creation record
-            SELECT job_id, started_at, store_url, dataset_name, job_type
-            FROM (
-                SELECT *,
-                       ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY started_at ASC) as rn_asc
-                FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-                WHERE job_type != 'status_update' OR job_type IS NULL
-            )
-            WHERE rn_asc = 1
-        )
-        SELECT 
-            f.job_id,
-            f.store_url,
-            f.dataset_name,
-            f.job_type,
-            l.status,
-            f.started_at,
-            l.completed_at,
-            l.error_message,
-            l.duration_seconds,
-            l.records_processed,
-            (SELECT COUNT(*) FROM `{self.project_id}.{self.jobs_dataset}.{self.logs_table}` logs 
-             WHERE logs.job_id = f.job_id AND logs.log_level = 'ERROR') as error_count
-        FROM first_record f
-        JOIN latest_record l ON f.job_id = l.job_id
-        WHERE f.store_url IS NOT NULL AND f.dataset_name IS NOT NULL
-        ORDER BY f.started_at DESC
-        LIMIT @limit
+    def get_recent_jobs(self, limit=20, statuses=None):
+        """Get recent jobs with summary, optionally filtered to specific statuses.
+
+        Filtering happens in BigQuery (status IN UNNEST(@statuses)) so we never
+        transfer rows the caller is going to throw away, and LIMIT applies
+        after the filter - asking for 10 completed jobs returns 10, not
+        "10 minus however many running jobs happened to be recent".
         """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("limit", "INTEGER", limit),
-            ]
-        )
-        
+        query = self._sql_recent_jobs_filtered if statuses else self._sql_recent_jobs
+
+        query_parameters = [
+            bigquery.ScalarQueryParameter("limit", "INTEGER", limit),
+        ]
+        if statuses:
+            query_parameters.append(
+                bigquery.ArrayQueryParameter("statuses", "STRING", list(statuses))
+            )
+
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+
         return list(self.client.query(query, job_config=job_config))
     
     def run_historical_load_async(self, store_config, job_id):
@@ -392,13 +869,14 @@ class JobManager:
                 env["PIPELINE_JOB_ID"] = job_id
                 env["TARGET_STORE"] = store_config.get("MERCHANT", "")
                 
-                # Run subprocess with unbuffered output
+                # Run subprocess with a buffered binary pipe - readline()
+                # in unbuffered text mode paid a syscall plus codec work
+                # per line; here we read 8 KB chunks and split on newlines
                 process = subprocess.Popen(
                     [sys.executable, "-u", historical_script],  # -u for unbuffered
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=0,  # No buffering
+                    bufsize=65536,
                     cwd=os.path.dirname(historical_script),
                     env=env
                 )
@@ -406,37 +884,52 @@ class JobManager:
                 # Store process reference for cancellation
                 self._running_processes = getattr(self, '_running_processes', {})
                 self._running_processes[job_id] = process
-                
-                # Capture output and log
-                while True:
-                    line = process.stdout.readline()
-                    if not line and process.poll() is not None:
-                        # Process has terminated and no more output
-                        break
-                    if line:
-                        line = line.rstrip("\n")
-                        
-                        # Determine log level
-                        if "[ERROR]" in line or "Error" in line or "error" in line:
-                            log_level = "ERROR"
-                        elif "[WARNING]" in line or "Warning" in line:
-                            log_level = "WARNING"
-                        else:
-                            log_level = "INFO"
-                        
-                        # Determine component
-                        component = "main"
-                        if "customer" in line.lower():
-                            component = "customers"
-                        elif "order" in line.lower() and "items" in line.lower():
-                            component = "order_items"
-                        elif "order" in line.lower():
-                            component = "orders"
-                        elif "product" in line.lower():
-                            component = "products"
-                        
-                        self.log_message(job_id, log_level, line, store_config.get('MERCHANT', 'unknown'), component)
-                
+
+                # cancel_job writes to this pipe to wake the selector
+                # immediately instead of waiting out a read
+                cancel_r, cancel_w = os.pipe()
+                self._cancel_pipes = getattr(self, '_cancel_pipes', {})
+                self._cancel_pipes[job_id] = cancel_w
+
+                merchant_name = store_config.get('MERCHANT', 'unknown')
+                stdout_fd = process.stdout.fileno()
+                sel = selectors.DefaultSelector()
+                sel.register(process.stdout, selectors.EVENT_READ)
+                sel.register(cancel_r, selectors.EVENT_READ)
+                buf = bytearray()
+                try:
+                    eof = cancelled = False
+                    while not eof and not cancelled:
+                        for key, _ in sel.select():
+                            if key.fileobj == cancel_r:
+                                os.read(cancel_r, 1)
+                                cancelled = True
+                                break
+                            chunk = os.read(stdout_fd, 8192)
+                            if not chunk:
+                                eof = True
+                                break
+                            buf += chunk
+                            while (newline := buf.find(b'\n')) != -1:
+                                line = bytes(buf[:newline]).decode('utf-8', 'replace').rstrip('\r')
+                                del buf[:newline + 1]
+                                if line:
+                                    log_level, component = _classify_line(line)
+                                    self.log_message(job_id, log_level, line, merchant_name, component)
+                    # Trailing output without a final newline
+                    if buf:
+                        line = bytes(buf).decode('utf-8', 'replace')
+                        log_level, component = _classify_line(line)
+                        self.log_message(job_id, log_level, line, merchant_name, component)
+                finally:
+                    sel.close()
+                    os.close(cancel_r)
+                    self._cancel_pipes.pop(job_id, None)
+                    try:
+                        os.close(cancel_w)
+                    except OSError:
+                        pass
+
                 process.wait()
                 
                 # Check if job status was already updated by the pipeline
@@ -462,62 +955,89 @@ class JobManager:
                 error_msg = f"Exception during historical load: {str(e)}\n{traceback.format_exc()}"
                 self.update_job_status(job_id, "failed", str(e))
                 self.log_message(job_id, "ERROR", error_msg, store_config.get('MERCHANT'), "main")
+            finally:
+                # Push any still-queued lines out before the thread exits
+                self.flush_logs()
         
-        # Start background thread and store reference
-        thread = threading.Thread(target=_run_in_background, daemon=True)
-        thread.start()
-        
-        # Store thread reference for potential cancellation
-        self._running_threads = getattr(self, '_running_threads', {})
-        self._running_threads[job_id] = thread
-        
-        return thread
+        # Submit to the bounded pool; extra requests queue instead of
+        # spawning more OS threads
+        future = self._executor.submit(_run_in_background)
+        self._running_futures[job_id] = future
+
+        return future
     
     def cancel_job(self, job_id):
         """Cancel a running job - simplified approach"""
+        # Tombstone: a double-click fires cancel twice before the first
+        # insert is visible in BigQuery, so short-circuit re-entrant calls
+        self._cancel_inflight = getattr(self, '_cancel_inflight', set())
+        if job_id in self._cancel_inflight:
+            print(f"[DEBUG] Cancel already in flight for job: {job_id}")
+            return True
+        self._cancel_inflight.add(job_id)
+        try:
+            return self._cancel_job(job_id)
+        finally:
+            self._cancel_inflight.discard(job_id)
+
+    def _cancel_job(self, job_id):
+        """Do the actual cancellation work (see cancel_job for the guard)"""
         try:
             print(f"[DEBUG] Attempting to cancel job: {job_id}")
-            
-            # Get original job info first
-            original_query = f"""
-            SELECT store_url, dataset_name
-            FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-            WHERE job_id = @job_id
-            LIMIT 1
-            """
+
+            # Latest status event - clustering on job_id keeps this a
+            # single-block lookup
             job_config = bigquery.QueryJobConfig(
                 query_parameters=[
                     bigquery.ScalarQueryParameter("job_id", "STRING", job_id),
                 ]
             )
-            original = list(self.client.query(original_query, job_config=job_config))
-            
-            store_url = original[0].store_url if original else "unknown"
-            dataset_name = original[0].dataset_name if original else "unknown"
-            
-            # Insert a new cancelled status record
-            from datetime import datetime, timezone
+            latest = list(self.client.query(self._sql_latest_status, job_config=job_config))
+
+            # Already in a terminal state - don't insert a second record
+            latest_status = latest[0].status if latest else None
+            if latest_status in ('cancelled', 'completed', 'failed'):
+                print(f"[DEBUG] Job {job_id} already {latest_status}, skipping cancel")
+                return True
+
+            # Insert a new cancelled status event
             cancel_data = {
                 "job_id": job_id,
-                "store_url": store_url,
-                "dataset_name": dataset_name, 
-                "job_type": "status_update",
                 "status": "cancelled",
-                "started_at": datetime.now(timezone.utc).isoformat(),
+                "ts": datetime.now(timezone.utc).isoformat(),
                 "error_message": "Cancelled by user",
-                "created_by": "user_cancel"
             }
-            
-            table_id = f"{self.project_id}.{self.jobs_dataset}.{self.jobs_table}"
-            errors = self.client.insert_rows_json(table_id, [cancel_data])
+
+            errors = self._insert_rows(
+                self.status_table_id, [cancel_data],
+                row_ids=[f"{job_id}:cancelled"],
+            )
+            if not errors:
+                self._jobs_version += 1  # invalidate the active-jobs cache
             
             if errors:
                 print(f"[ERROR] Failed to insert cancel record: {errors}")
                 return False
             
-            # Log the cancellation
+            # Log the cancellation and flush so the record is visible
+            # to the UI straight away
             self.log_message(job_id, "WARNING", "Job cancelled by user", component="main")
+            self.flush_logs()
             
+            # A load still queued in the executor can be cancelled before
+            # it ever starts a subprocess
+            future = getattr(self, '_running_futures', {}).get(job_id)
+            if future is not None and future.cancel():
+                print(f"[DEBUG] Cancelled queued load for job {job_id}")
+
+            # Wake the capture loop's selector so it stops reading
+            cancel_fd = getattr(self, '_cancel_pipes', {}).get(job_id)
+            if cancel_fd is not None:
+                try:
+                    os.write(cancel_fd, b'x')
+                except OSError:
+                    pass
+
             # Try to kill the process if we have it tracked
             if hasattr(self, '_running_processes'):
                 process = self._running_processes.get(job_id)
@@ -544,18 +1064,12 @@ class JobManager:
     
     def debug_job_status(self, job_id):
         """Debug method to see all records for a job"""
-        query = f"""
-        SELECT job_id, status, started_at, job_type
-        FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-        WHERE job_id = @job_id
-        ORDER BY started_at DESC
-        """
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("job_id", "STRING", job_id),
             ]
         )
-        results = list(self.client.query(query, job_config=job_config))
+        results = list(self.client.query(self._sql_debug_status, job_config=job_config))
         return results
     
     def force_clean_stuck_jobs(self, hours=1):
@@ -563,48 +1077,47 @@ class JobManager:
         try:
             # Find stuck jobs
             query = f"""
-            WITH job_timeline AS (
-                SELECT *,
-                       ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY started_at DESC) as rn
-                FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-            ),
-            latest_status AS (
-                SELECT job_id, status, store_url, dataset_name, started_at
-                FROM job_timeline
-                WHERE rn = 1
-            )
-            SELECT job_id, store_url, dataset_name, started_at
-            FROM latest_status
-            WHERE status = 'pending'
-                AND started_at < TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {hours} HOUR)
+            SELECT f.job_id, f.original_store_url as store_url,
+                   f.original_dataset_name as dataset_name,
+                   f.original_started_at as started_at
+            FROM `{self.project_id}.{self.jobs_dataset}.mv_job_first_record` f
+            LEFT JOIN `{self.project_id}.{self.jobs_dataset}.mv_status_latest_ts` st
+                ON f.job_id = st.job_id
+            LEFT JOIN `{self.project_id}.{self.jobs_dataset}.{self.status_table}` se
+                ON se.job_id = st.job_id AND se.ts = st.latest_ts
+            WHERE COALESCE(se.status, 'pending') = 'pending'
+                AND f.original_started_at < TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {hours} HOUR)
             """
             
             stuck_jobs = list(self.client.query(query))
-            cleaned = 0
-            
-            for job in stuck_jobs:
-                try:
-                    # Insert failed status
-                    fail_data = {
-                        "job_id": job.job_id,
-                        "store_url": job.store_url,
-                        "dataset_name": job.dataset_name,
-                        "job_type": "status_update",
-                        "status": "failed",
-                        "started_at": datetime.now(timezone.utc).isoformat(),
-                        "error_message": f"Job timeout - stuck for over {hours} hours",
-                        "created_by": "system_cleanup"
-                    }
-                    
-                    table_id = f"{self.project_id}.{self.jobs_dataset}.{self.jobs_table}"
-                    errors = self.client.insert_rows_json(table_id, [fail_data])
-                    
-                    if not errors:
-                        cleaned += 1
-                        print(f"[DEBUG] Cleaned stuck job: {job.job_id}")
-                except Exception as e:
-                    print(f"[ERROR] Failed to clean job {job.job_id}: {e}")
-            
+            if not stuck_jobs:
+                return 0, 0
+
+            # One insert for the whole batch instead of one RPC per job
+            now_iso = datetime.now(timezone.utc).isoformat()
+            fail_rows = [
+                {
+                    "job_id": job.job_id,
+                    "status": "failed",
+                    "ts": now_iso,
+                    "error_message": f"Job timeout - stuck for over {hours} hours",
+                }
+                for job in stuck_jobs
+            ]
+            # row_ids make the cleanup idempotent - a retried batch
+            # dedupes instead of double-failing the same job
+            errors = self._insert_rows(
+                self.status_table_id, fail_rows,
+                row_ids=[f"{job.job_id}:timeout" for job in stuck_jobs],
+            )
+            if errors:
+                print(f"[ERROR] Failed to clean some stuck jobs: {errors}")
+            failed_indexes = {e.get('index') for e in errors} if errors else set()
+            cleaned = len(fail_rows) - len(failed_indexes)
+            for i, job in enumerate(stuck_jobs):
+                if i not in failed_indexes:
+                    print(f"[DEBUG] Cleaned stuck job: {job.job_id}")
+
             return cleaned, len(stuck_jobs)
             
         except Exception as e:
@@ -3,56 +3,76 @@ Cloud-ready API for Shopify client onboarding
 Deployable to Cloud Run or Cloud Functions
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel, validator
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
+from pydantic import BaseModel, ConfigDict, field_validator
+import asyncio
+import hashlib
+import json
 import os
 import sys
 import re
-from typing import Optional
-from datetime import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal, Optional
+from datetime import datetime, timezone
 
 # Add scripts to path
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts'))
 from onboard_client import ShopifyClientOnboarding
 
+# orjson serializes responses several times faster than stdlib json;
+# fall back to the defaults when it isn't installed
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+    _default_response_class = ORJSONResponse
+except ImportError:
+    orjson = None
+    from fastapi.responses import JSONResponse as _default_response_class
+
 app = FastAPI(
     title="Shopify Client Onboarding API",
     description="Automated onboarding service for Shopify clients",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=_default_response_class
 )
 
+# Compiled once - the validator runs per request field, so skip re's
+# per-call cache lookup
+_CLIENT_ID_RE = re.compile(r'^[a-z0-9_]+$')
+
 class OnboardingRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
     client_id: str
     client_name: str
     merchant_url: str
     access_token: str
     contact_email: str
-    memory: str = "2Gi"
+    # Literal validates in pydantic-core rather than a Python validator
+    memory: Literal['2Gi', '4Gi', '8Gi'] = "2Gi"
     run_initial_load: bool = True
-    
-    @validator('client_id')
+
+    @field_validator('client_id')
+    @classmethod
     def validate_client_id(cls, v):
-        if not re.match(r'^[a-z0-9_]+$', v):
+        if not _CLIENT_ID_RE.match(v):
             raise ValueError('Client ID must contain only lowercase letters, numbers, and underscores')
         return v
-    
-    @validator('merchant_url')
+
+    @field_validator('merchant_url')
+    @classmethod
     def validate_merchant_url(cls, v):
         if not v.endswith('.myshopify.com'):
             raise ValueError('Merchant URL must end with .myshopify.com')
         return v
-    
-    @validator('access_token')
+
+    @field_validator('access_token')
+    @classmethod
     def validate_token(cls, v):
         if not v.startswith('shpat_'):
             raise ValueError('Access token must start with shpat_')
         return v
-    
-    @validator('memory')
-    def validate_memory(cls, v):
-        if v not in ['2Gi', '4Gi', '8Gi']:
-            raise ValueError('Memory must be 2Gi, 4Gi, or 8Gi')
-        return v
 
 class OnboardingResponse(BaseModel):
     status: str
@@ -63,8 +83,105 @@ class OnboardingResponse(BaseModel):
     started_at: str
     completed_at: Optional[str] = None
 
-# In-memory status tracking (use Redis or Firestore in production)
-onboarding_status = {}
+class StatusStore:
+    """Onboarding status shared across workers via Firestore.
+
+    A per-process dict breaks under multiple uvicorn workers - /status
+    would 404 or allow duplicate onboarding depending on which worker
+    answers. One document per client keeps the state visible everywhere
+    and survives restarts.
+    """
+
+    def __init__(self, project_id=None):
+        from google.cloud import firestore
+        self._firestore = firestore
+        self.client = firestore.Client(project=project_id)
+        self._collection = self.client.collection("onboarding_status")
+
+    def start(self, client_id, record):
+        """Claim an onboarding slot atomically.
+
+        Returns False when the client already has an in-progress run -
+        the check and the write happen in one transaction, so two
+        concurrent /onboard calls can't both claim it.
+        """
+        doc_ref = self._collection.document(client_id)
+        transaction = self.client.transaction()
+
+        @self._firestore.transactional
+        def _claim(txn):
+            snapshot = doc_ref.get(transaction=txn)
+            if snapshot.exists and snapshot.to_dict().get('status') == 'in_progress':
+                return False
+            txn.set(doc_ref, record)
+            return True
+
+        return _claim(transaction)
+
+    def get(self, client_id):
+        snapshot = self._collection.document(client_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def update(self, client_id, fields):
+        self._collection.document(client_id).set(fields, merge=True)
+
+class LocalStatusStore:
+    """Dict-backed fallback with the same interface, for local dev"""
+
+    def __init__(self):
+        self._status = {}
+
+    def start(self, client_id, record):
+        existing = self._status.get(client_id)
+        if existing and existing.get('status') == 'in_progress':
+            return False
+        self._status[client_id] = dict(record)
+        return True
+
+    def get(self, client_id):
+        return self._status.get(client_id)
+
+    def update(self, client_id, fields):
+        self._status.setdefault(client_id, {}).update(fields)
+
+# Onboarding is CPU- and network-heavy synchronous work; running it as a
+# coroutine background task would occupy the event loop and starve
+# /status and /health for its whole duration. The pool keeps it in
+# separate processes entirely.
+PROCESS_POOL = ProcessPoolExecutor(max_workers=int(os.getenv("ONBOARD_WORKERS", "4")))
+
+def _do_onboarding(request_data):
+    """Runs inside a pool worker - top level so it pickles cleanly"""
+    onboarding = ShopifyClientOnboarding(
+        project_id=os.getenv("GCP_PROJECT_ID", "happyweb-340014")
+    )
+    return onboarding.onboard_client(
+        client_id=request_data['client_id'],
+        merchant_url=request_data['merchant_url'],
+        token=request_data['access_token'],
+        memory=request_data['memory'],
+        run_initial=request_data['run_initial_load']
+    )
+
+try:
+    status_store = StatusStore(os.getenv("GCP_PROJECT_ID"))
+except Exception as e:
+    print(f"Firestore status store unavailable, using in-memory fallback: {e}")
+    status_store = LocalStatusStore()
+
+# Async Firestore client for the client registry - created lazily since
+# AsyncClient wants a running event loop. One document per client means
+# O(1) writes and no lost-update race between workers, unlike the old
+# read-append-rewrite of client_registry.json (which also didn't survive
+# Cloud Run's ephemeral filesystem).
+_registry_db = None
+
+def _get_registry_db():
+    global _registry_db
+    if _registry_db is None:
+        from google.cloud import firestore
+        _registry_db = firestore.AsyncClient(project=os.getenv("GCP_PROJECT_ID"))
+    return _registry_db
 
 @app.get("/")
 async def health_check():
@@ -72,7 +189,7 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "shopify-onboarding-api",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.post("/onboard", response_model=OnboardingResponse)
@@ -84,21 +201,23 @@ async def onboard_client(request: OnboardingRequest, background_tasks: Backgroun
     in the background, returning immediately with a tracking ID.
     """
     
-    # Check if client already being onboarded
-    if request.client_id in onboarding_status:
-        status = onboarding_status[request.client_id]
-        if status['status'] == 'in_progress':
-            raise HTTPException(
-                status_code=409,
-                detail=f"Client {request.client_id} is already being onboarded"
-            )
-    
-    # Initialize status
-    onboarding_status[request.client_id] = {
+    # One timestamp per request - the status record and the response
+    # agree exactly, and aware UTC avoids naive-datetime comparisons
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    # Claim the onboarding slot; the store rejects a duplicate
+    # in-progress run atomically. The Firestore client is synchronous,
+    # so the call runs in a worker thread to keep the event loop clear.
+    claimed = await asyncio.to_thread(status_store.start, request.client_id, {
         'status': 'in_progress',
-        'started_at': datetime.now().isoformat(),
-        'request': request.dict()
-    }
+        'started_at': now_iso,
+        'request': request.model_dump()
+    })
+    if not claimed:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Client {request.client_id} is already being onboarded"
+        )
     
     # Add background task
     background_tasks.add_task(
@@ -111,101 +230,114 @@ async def onboard_client(request: OnboardingRequest, background_tasks: Backgroun
         message="Onboarding process started",
         client_id=request.client_id,
         dataset_name=f"shopify_{request.client_id}",
-        started_at=datetime.now().isoformat()
+        started_at=now_iso
     )
 
 @app.get("/status/{client_id}")
 async def get_onboarding_status(client_id: str):
     """Check the status of an onboarding process"""
     
-    if client_id not in onboarding_status:
+    status = await asyncio.to_thread(status_store.get, client_id)
+    if status is None:
         raise HTTPException(
             status_code=404,
             detail=f"No onboarding found for client {client_id}"
         )
-    
-    return onboarding_status[client_id]
+
+    return status
+
+# Registry writes bump this counter; /clients reuses its last serialized
+# payload (and ETag) until the version moves or the entry ages out, so
+# polling dashboards mostly cost a hash compare instead of a Firestore
+# scan per hit.
+_registry_version = 0
+_clients_cache = None  # (version, fetched_at, etag, payload)
+_CLIENTS_CACHE_SECONDS = 30.0
 
 @app.get("/clients")
-async def list_clients():
+async def list_clients(request: Request, response: Response):
     """List all clients and their onboarding status"""
-    
-    # In production, read from database
-    config_path = "../configs/store_configs.json"
-    if os.path.exists(config_path):
-        import json
-        with open(config_path, 'r') as f:
-            configs = json.load(f)
-        return {
-            "clients": configs,
-            "total": len(configs)
+    global _clients_cache
+
+    cached = _clients_cache
+    if not (cached and cached[0] == _registry_version
+            and time.monotonic() - cached[1] < _CLIENTS_CACHE_SECONDS):
+        try:
+            db = _get_registry_db()
+            clients = [doc.to_dict() async for doc in db.collection("clients").stream()]
+        except Exception as e:
+            print(f"Failed to list clients from Firestore: {e}")
+            clients = []
+
+        payload = {
+            "clients": clients,
+            "total": len(clients)
         }
-    
-    return {"clients": [], "total": 0}
+        if orjson is not None:
+            body = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)
+        else:
+            body = json.dumps(payload, sort_keys=True, default=str).encode()
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        cached = _clients_cache = (_registry_version, time.monotonic(), etag, payload)
+
+    _, _, etag, payload = cached
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "max-age=30, must-revalidate"
+    return payload
 
 async def run_onboarding(request: OnboardingRequest):
     """Background task to run the actual onboarding"""
     
     client_id = request.client_id
-    project_id = os.getenv("GCP_PROJECT_ID", "happyweb-340014")
-    
+
     try:
-        # Create onboarding instance
-        onboarding = ShopifyClientOnboarding(project_id=project_id)
-        
-        # Run onboarding
-        success = onboarding.onboard_client(
-            client_id=request.client_id,
-            merchant_url=request.merchant_url,
-            token=request.access_token,
-            memory=request.memory,
-            run_initial=request.run_initial_load
+        # Hand the blocking work to the process pool and yield the loop
+        loop = asyncio.get_running_loop()
+        success = await loop.run_in_executor(
+            PROCESS_POOL, _do_onboarding, request.model_dump()
         )
         
         # Update status
-        onboarding_status[client_id]['status'] = 'completed' if success else 'failed'
-        onboarding_status[client_id]['completed_at'] = datetime.now().isoformat()
+        await asyncio.to_thread(status_store.update, client_id, {
+            'status': 'completed' if success else 'failed',
+            'completed_at': datetime.now(timezone.utc).isoformat()
+        })
         
         # Save client info if successful
         if success:
-            save_client_info(request)
+            await save_client_info(request)
             
     except Exception as e:
-        onboarding_status[client_id]['status'] = 'failed'
-        onboarding_status[client_id]['error'] = str(e)
-        onboarding_status[client_id]['completed_at'] = datetime.now().isoformat()
+        await asyncio.to_thread(status_store.update, client_id, {
+            'status': 'failed',
+            'error': str(e),
+            'completed_at': datetime.now(timezone.utc).isoformat()
+        })
 
-def save_client_info(request: OnboardingRequest):
+async def save_client_info(request: OnboardingRequest):
     """Save client information to persistent storage"""
-    
-    # In production, use Firestore or CloudSQL
-    config_path = "../configs/client_registry.json"
-    
+
     client_info = {
         "client_id": request.client_id,
         "client_name": request.client_name,
         "contact_email": request.contact_email,
         "merchant_url": request.merchant_url,
-        "onboarded_at": datetime.now().isoformat(),
+        "onboarded_at": datetime.now(timezone.utc).isoformat(),
         "dataset_name": f"shopify_{request.client_id}",
         "active": True
     }
-    
-    # Load existing registry
-    if os.path.exists(config_path):
-        import json
-        with open(config_path, 'r') as f:
-            registry = json.load(f)
-    else:
-        registry = []
-    
-    # Add new client
-    registry.append(client_info)
-    
-    # Save back
-    os.makedirs(os.path.dirname(config_path), exist_ok=True)
-    with open(config_path, 'w') as f:
-        json.dump(registry, f, indent=2)
+
+    # One document per client - filtered listings on (active,
+    # onboarded_at) need a composite index, defined in the deployment
+    db = _get_registry_db()
+    await db.collection("clients").document(request.client_id).set(client_info)
+
+    # Invalidate the /clients cache so the new client shows up promptly
+    global _registry_version
+    _registry_version += 1
 
 # For Cloud Functions deployment
 def onboard_client_function(request):
@@ -225,8 +357,18 @@ def onboard_client_function(request):
         onboard_client(onboarding_request, BackgroundTasks())
     )
     
-    return response.dict()
+    return response.model_dump()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # uvloop + httptools replace asyncio's default loop and h11 parser;
+    # WEB_CONCURRENCY follows the usual 2n+1 worker sizing. Status and
+    # the client registry live in Firestore, so workers share state.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8080,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+    )
\ No newline at end of file
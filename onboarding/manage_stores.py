@@ -103,14 +103,9 @@ def add_store(store_manager):
 
 def update_store(store_manager, merchant):
     """Update an existing store"""
-    # Get current config
-    stores = store_manager.get_store_configs(active_only=False)
-    current = None
-    for store in stores:
-        if store['MERCHANT'] == merchant:
-            current = store
-            break
-    
+    # Get current config with a point query - no need to scan every store
+    current = store_manager.get_store_by_merchant(merchant)
+
     if not current:
         print(f"[ERROR] Store not found: {merchant}")
         return
@@ -159,8 +154,8 @@ def main():
     add_parser = subparsers.add_parser('add', help='Add a new store')
     
     # Update command
-    update_parser = subparsers.add_parser('update', help='Update a store')
-    update_parser.add_argument('merchant', help='Store URL (e.g., example.myshopify.com)')
+    update_parser = subparsers.add_parser('update', help='Update one or more stores')
+    update_parser.add_argument('merchants', nargs='+', help='Store URL(s) (e.g., example.myshopify.com)')
     
     # Deactivate command
     deactivate_parser = subparsers.add_parser('deactivate', help='Deactivate a store')
@@ -186,7 +181,9 @@ def main():
     elif args.command == 'add':
         add_store(store_manager)
     elif args.command == 'update':
-        update_store(store_manager, args.merchant)
+        # Each store is a point query, so a scripted batch stays cheap
+        for merchant in args.merchants:
+            update_store(store_manager, merchant)
     elif args.command == 'deactivate':
         deactivate_store(store_manager, args.merchant)
 
@@ -4,21 +4,28 @@ Add this method to JobManager class to prevent duplicate jobs
 
 def has_active_job_for_store(self, store_url):
     """Check if there's already an active job for a store"""
+    # Latest status lives in the pipeline_job_status event table - the
+    # pipeline_jobs creation row stays 'pending' forever, so reading
+    # status from it would flag every recent job as active. The jobs
+    # table narrows the scan: it is day-partitioned on started_at (the
+    # 7-day bound prunes partitions, and only recent jobs can still be
+    # pending or running) and carries store_url among its clustering
+    # fields. EXISTS lets BigQuery stop at the first active job.
     query = f"""
-    WITH job_timeline AS (
-        SELECT *,
-               ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY started_at DESC) as rn
-        FROM `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}`
-    ),
-    latest_status AS (
-        SELECT job_id, status, store_url
-        FROM job_timeline
-        WHERE rn = 1
-    )
-    SELECT COUNT(*) as active_count
-    FROM latest_status
-    WHERE store_url = @store_url
-      AND status IN ('pending', 'running')
+    SELECT EXISTS(
+        SELECT 1
+        FROM (
+            SELECT s.job_id,
+                   MAX_BY(s.status, s.ts) AS status
+            FROM `{self.project_id}.{self.jobs_dataset}.{self.status_table}` s
+            JOIN `{self.project_id}.{self.jobs_dataset}.{self.jobs_table}` j
+              ON j.job_id = s.job_id
+            WHERE j.store_url = @store_url
+              AND j.started_at > TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+            GROUP BY s.job_id
+        )
+        WHERE status IN ('pending', 'running')
+    ) AS has_job
     """
     
     job_config = bigquery.QueryJobConfig(
@@ -29,7 +36,7 @@ def has_active_job_for_store(self, store_url):
     
     try:
         result = list(self.client.query(query, job_config=job_config))
-        return result[0].active_count > 0 if result else False
+        return result[0].has_job if result else False
     except Exception as e:
         print(f"[ERROR] Failed to check active jobs: {e}")
         return False
@@ -3,23 +3,66 @@
 Store configuration management using BigQuery
 """
 
+import json
 import os
+import time
 from datetime import datetime, timezone
 from google.cloud import bigquery
 import uuid
 
+# Clients are shared per project for the process lifetime - callers
+# construct StoreManager freely (CLI, migration script, UI) and each
+# fresh client costs an auth handshake plus a new connection pool
+_clients = {}
+
+def _get_client(project_id):
+    client = _clients.get(project_id)
+    if client is None:
+        client = _clients[project_id] = bigquery.Client(project=project_id)
+    return client
+
+# Storage Read API client for bulk fetches - columnar Arrow batches are
+# much cheaper per row than the REST tabledata path. Optional: falls
+# back to REST when google-cloud-bigquery-storage/pyarrow are absent.
+_bqstorage_client = None
+_bqstorage_tried = False
+
+def _get_bqstorage_client():
+    global _bqstorage_client, _bqstorage_tried
+    if not _bqstorage_tried:
+        _bqstorage_tried = True
+        try:
+            from google.cloud import bigquery_storage
+            _bqstorage_client = bigquery_storage.BigQueryReadClient()
+        except Exception:
+            _bqstorage_client = None
+    return _bqstorage_client
+
 class StoreManager:
+    # Tables already ensured this process, keyed by full table id -
+    # the dataset/table create round trips only need to happen once
+    _ensured = set()
+
     def __init__(self, project_id=None):
         self.project_id = project_id or os.environ.get("GCP_PROJECT_ID") or "happyweb-340014"
-        self.client = bigquery.Client(project=self.project_id)
+        self.client = _get_client(self.project_id)
         self.dataset = "shopify_logs"
         self.table = "store_config"
-        
+
+        # Config reads within this window are served from memory - the
+        # CLI and migration paths otherwise re-scan the table per call
+        self._cache = {}
+        self._cache_ttl = 60.0
+
         # Initialize table
         self._ensure_store_config_table()
     
     def _ensure_store_config_table(self):
-        """Create store config table if it doesn't exist"""
+        """Create store config table if it doesn't exist (once per process)"""
+        table_key = f"{self.project_id}.{self.dataset}.{self.table}"
+        if table_key in StoreManager._ensured:
+            return
+
         # Create dataset if needed
         dataset_id = f"{self.project_id}.{self.dataset}"
         dataset = bigquery.Dataset(dataset_id)
@@ -47,7 +90,11 @@ class StoreManager:
         ]
         
         table = bigquery.Table(table_id, schema=schema)
+        # Cluster on merchant so point lookups and MERGEs only read the
+        # matching blocks
+        table.clustering_fields = ["merchant"]
         table = self.client.create_table(table, exists_ok=True)
+        StoreManager._ensured.add(table_key)
     
     def get_store_configs(self, active_only=True):
         """Get all store configurations"""
@@ -67,130 +114,173 @@ class StoreManager:
         ORDER BY merchant
         """
         
+        cached = self._cache.get(active_only)
+        if cached and time.time() - cached[0] < self._cache_ttl:
+            return list(cached[1])
+
         try:
-            results = list(self.client.query(query))
-            configs = []
-            for row in results:
-                config = {
-                    "MERCHANT": row.merchant,
-                    "TOKEN": row.token,
-                    "GCP_PROJECT_ID": row.gcp_project_id,
-                    "BIGQUERY_DATASET": row.bigquery_dataset,
-                    "BACKFILL_START_DATE": row.backfill_start_date.isoformat() if row.backfill_start_date else None,
-                    "last_updated": row.updated_at.isoformat() if row.updated_at else None,
-                    "is_active": row.is_active,
-                    # Add standard table names
-                    "BIGQUERY_TABLE_CUSTOMER_INSIGHTS": "customer_insights",
-                    "BIGQUERY_TABLE_ORDER_INSIGHTS": "order_insights",
-                    "BIGQUERY_TABLE_ORDER_ITEMS_INSIGHTS": "order_items_insights",
-                    "BIGQUERY_TABLE_PRODUCT_INSIGHTS": "products_insights",
-                }
-                # Add metadata fields if present
-                if row.metadata:
-                    config.update(row.metadata)
-                configs.append(config)
-            return configs
+            bqstorage = _get_bqstorage_client()
+            if bqstorage is not None:
+                # Bulk read via the Storage Read API: Arrow batches the
+                # columns, then one to_pylist materializes the rows
+                arrow_table = self.client.query(query).to_arrow(bqstorage_client=bqstorage)
+                configs = [self._record_to_config(record) for record in arrow_table.to_pylist()]
+            else:
+                configs = [self._row_to_config(row) for row in self.client.query(query)]
+            self._cache[active_only] = (time.time(), configs)
+            return list(configs)
         except Exception as e:
             print(f"[ERROR] Failed to get store configs: {e}")
             # Return empty list if table doesn't exist yet
             return []
+
+    def _row_to_config(self, row):
+        """Convert a store_config row to the pipeline config dict shape"""
+        config = {
+            "MERCHANT": row.merchant,
+            "TOKEN": row.token,
+            "GCP_PROJECT_ID": row.gcp_project_id,
+            "BIGQUERY_DATASET": row.bigquery_dataset,
+            "BACKFILL_START_DATE": row.backfill_start_date.isoformat() if row.backfill_start_date else None,
+            "last_updated": row.updated_at.isoformat() if row.updated_at else None,
+            "is_active": row.is_active,
+            # Add standard table names
+            "BIGQUERY_TABLE_CUSTOMER_INSIGHTS": "customer_insights",
+            "BIGQUERY_TABLE_ORDER_INSIGHTS": "order_insights",
+            "BIGQUERY_TABLE_ORDER_ITEMS_INSIGHTS": "order_items_insights",
+            "BIGQUERY_TABLE_PRODUCT_INSIGHTS": "products_insights",
+        }
+        # Add metadata fields if present
+        if row.metadata:
+            config.update(row.metadata)
+        return config
+
+    def _record_to_config(self, record):
+        """Same mapping as _row_to_config, for Arrow to_pylist dicts"""
+        config = {
+            "MERCHANT": record["merchant"],
+            "TOKEN": record["token"],
+            "GCP_PROJECT_ID": record["gcp_project_id"],
+            "BIGQUERY_DATASET": record["bigquery_dataset"],
+            "BACKFILL_START_DATE": record["backfill_start_date"].isoformat() if record["backfill_start_date"] else None,
+            "last_updated": record["updated_at"].isoformat() if record["updated_at"] else None,
+            "is_active": record["is_active"],
+            # Add standard table names
+            "BIGQUERY_TABLE_CUSTOMER_INSIGHTS": "customer_insights",
+            "BIGQUERY_TABLE_ORDER_INSIGHTS": "order_insights",
+            "BIGQUERY_TABLE_ORDER_ITEMS_INSIGHTS": "order_items_insights",
+            "BIGQUERY_TABLE_PRODUCT_INSIGHTS": "products_insights",
+        }
+        # JSON columns arrive as strings through Arrow
+        metadata = record.get("metadata")
+        if metadata:
+            config.update(json.loads(metadata) if isinstance(metadata, str) else metadata)
+        return config
+
+    def get_merchant_set(self):
+        """Return the set of configured merchants (merchant column only)"""
+        query = f"""
+        SELECT merchant
+        FROM `{self.project_id}.{self.dataset}.{self.table}`
+        """
+        try:
+            return {row.merchant for row in self.client.query(query)}
+        except Exception as e:
+            print(f"[ERROR] Failed to get merchant set: {e}")
+            return set()
+
+    def get_store_by_merchant(self, merchant):
+        """Fetch one store's config with a point query (or None)"""
+        query = f"""
+        SELECT 
+            merchant,
+            token,
+            gcp_project_id,
+            bigquery_dataset,
+            backfill_start_date,
+            is_active,
+            created_at,
+            updated_at,
+            metadata
+        FROM `{self.project_id}.{self.dataset}.{self.table}`
+        WHERE merchant = @merchant
+        LIMIT 1
+        """
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("merchant", "STRING", merchant),
+            ]
+        )
+
+        try:
+            results = list(self.client.query(query, job_config=job_config))
+            return self._row_to_config(results[0]) if results else None
+        except Exception as e:
+            print(f"[ERROR] Failed to get store config for {merchant}: {e}")
+            return None
     
     def upsert_store_config(self, config, user=None):
         """Insert or update a store configuration"""
         merchant = config.get("MERCHANT", "unknown")
         print(f"[StoreManager] Starting upsert for merchant: {merchant}", flush=True)
-        
-        # Check if store exists
-        check_query = f"""
-        SELECT merchant FROM `{self.project_id}.{self.dataset}.{self.table}`
-        WHERE merchant = @merchant
-        LIMIT 1
+
+        # One MERGE replaces the old existence check + insert/update
+        # branches, and DML never lands in the streaming buffer
+        metadata = config.get("metadata")
+        if not (metadata and isinstance(metadata, dict)):
+            metadata = None
+
+        merge_query = f"""
+        MERGE `{self.project_id}.{self.dataset}.{self.table}` AS target
+        USING (
+            SELECT 
+                @merchant as merchant,
+                @token as token,
+                @gcp_project_id as gcp_project_id,
+                @bigquery_dataset as bigquery_dataset,
+                @backfill_start_date as backfill_start_date,
+                @is_active as is_active,
+                PARSE_JSON(@metadata) as metadata,
+                CURRENT_TIMESTAMP() as ts,
+                @user as user
+        ) AS source
+        ON target.merchant = source.merchant
+        WHEN MATCHED THEN
+            UPDATE SET
+                token = source.token,
+                gcp_project_id = source.gcp_project_id,
+                bigquery_dataset = source.bigquery_dataset,
+                backfill_start_date = source.backfill_start_date,
+                is_active = source.is_active,
+                updated_at = source.ts,
+                updated_by = source.user
+        WHEN NOT MATCHED THEN
+            INSERT (merchant, token, gcp_project_id, bigquery_dataset,
+                    backfill_start_date, is_active, created_at, updated_at,
+                    created_by, updated_by, metadata)
+            VALUES (source.merchant, source.token, source.gcp_project_id,
+                    source.bigquery_dataset, source.backfill_start_date,
+                    source.is_active, source.ts, source.ts,
+                    source.user, source.user, source.metadata)
         """
-        
+
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("merchant", "STRING", config["MERCHANT"]),
+                bigquery.ScalarQueryParameter("token", "STRING", config["TOKEN"]),
+                bigquery.ScalarQueryParameter("gcp_project_id", "STRING", config.get("GCP_PROJECT_ID", self.project_id)),
+                bigquery.ScalarQueryParameter("bigquery_dataset", "STRING", config["BIGQUERY_DATASET"]),
+                bigquery.ScalarQueryParameter("backfill_start_date", "DATE", config.get("BACKFILL_START_DATE", "2024-01-01")),
+                bigquery.ScalarQueryParameter("is_active", "BOOL", config.get("is_active", True)),
+                bigquery.ScalarQueryParameter("metadata", "STRING", json.dumps(metadata) if metadata else None),
+                bigquery.ScalarQueryParameter("user", "STRING", user or "system"),
             ]
         )
-        
-        try:
-            exists = len(list(self.client.query(check_query, job_config=job_config))) > 0
-        except:
-            exists = False
-        
-        if exists:
-            # Skip update if store already exists to avoid streaming buffer issues
-            print(f"[StoreManager] Store {merchant} already exists - skipping update to avoid streaming buffer issues", flush=True)
-            return
-            
-            # OLD CODE BELOW - Keeping for reference but not executing
-            # Update existing using MERGE to handle streaming buffer
-            merge_query = f"""
-            MERGE `{self.project_id}.{self.dataset}.{self.table}` AS target
-            USING (
-                SELECT 
-                    @merchant as merchant,
-                    @token as token,
-                    @gcp_project_id as gcp_project_id,
-                    @bigquery_dataset as bigquery_dataset,
-                    @backfill_start_date as backfill_start_date,
-                    @is_active as is_active,
-                    CURRENT_TIMESTAMP() as updated_at,
-                    @user as updated_by
-            ) AS source
-            ON target.merchant = source.merchant
-            WHEN MATCHED THEN
-                UPDATE SET
-                    token = source.token,
-                    gcp_project_id = source.gcp_project_id,
-                    bigquery_dataset = source.bigquery_dataset,
-                    backfill_start_date = source.backfill_start_date,
-                    is_active = source.is_active,
-                    updated_at = source.updated_at,
-                    updated_by = source.updated_by
-            """
-            
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ScalarQueryParameter("merchant", "STRING", config["MERCHANT"]),
-                    bigquery.ScalarQueryParameter("token", "STRING", config["TOKEN"]),
-                    bigquery.ScalarQueryParameter("gcp_project_id", "STRING", config.get("GCP_PROJECT_ID", self.project_id)),
-                    bigquery.ScalarQueryParameter("bigquery_dataset", "STRING", config["BIGQUERY_DATASET"]),
-                    bigquery.ScalarQueryParameter("backfill_start_date", "DATE", config.get("BACKFILL_START_DATE", "2024-01-01")),
-                    bigquery.ScalarQueryParameter("is_active", "BOOL", config.get("is_active", True)),
-                    bigquery.ScalarQueryParameter("user", "STRING", user or "system"),
-                ]
-            )
-            
-            self.client.query(merge_query, job_config=job_config).result()
-            print(f"[StoreManager] Successfully updated existing store: {merchant}", flush=True)
-        else:
-            # Insert new
-            insert_data = {
-                "merchant": config["MERCHANT"],
-                "token": config["TOKEN"],
-                "gcp_project_id": config.get("GCP_PROJECT_ID", self.project_id),
-                "bigquery_dataset": config["BIGQUERY_DATASET"],
-                "backfill_start_date": config.get("BACKFILL_START_DATE", "2024-01-01"),
-                "is_active": config.get("is_active", True),
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat(),
-                "created_by": user or "system",
-                "updated_by": user or "system",
-                # Don't include metadata field if not needed - it will be NULL
-            }
-            
-            # Only add metadata if it exists and has content
-            if config.get("metadata") and isinstance(config["metadata"], dict) and config["metadata"]:
-                insert_data["metadata"] = config["metadata"]
-            
-            table_id = f"{self.project_id}.{self.dataset}.{self.table}"
-            errors = self.client.insert_rows_json(table_id, [insert_data])
-            
-            if errors:
-                raise Exception(f"Failed to insert store config: {errors}")
-            
-            print(f"[StoreManager] Successfully inserted new store: {merchant}", flush=True)
+
+        self.client.query(merge_query, job_config=job_config).result()
+        self._cache.clear()
+        print(f"[StoreManager] Successfully upserted store: {merchant}", flush=True)
     
     def delete_store_config(self, merchant):
         """Soft delete a store by marking as inactive"""
@@ -209,15 +299,55 @@ class StoreManager:
         )
         
         self.client.query(update_query, job_config=job_config).result()
+        self._cache.clear()
     
     def migrate_from_json(self, json_configs):
         """Migrate configurations from JSON file to BigQuery"""
-        migrated = 0
+        table_id = f"{self.project_id}.{self.dataset}.{self.table}"
+
+        # One single-column query for the merchants that already exist,
+        # instead of an existence check per store
+        existing = self.get_merchant_set()
+
+        now = datetime.now(timezone.utc).isoformat()
+        rows = []
         for config in json_configs:
-            try:
-                self.upsert_store_config(config, user="migration")
-                migrated += 1
-                print(f"Migrated store: {config['MERCHANT']}")
-            except Exception as e:
-                print(f"Failed to migrate {config['MERCHANT']}: {e}")
-        return migrated
\ No newline at end of file
+            merchant = config.get("MERCHANT", "unknown")
+            if merchant in existing:
+                print(f"Skipping existing store: {merchant}")
+                continue
+            row = {
+                "merchant": config["MERCHANT"],
+                "token": config["TOKEN"],
+                "gcp_project_id": config.get("GCP_PROJECT_ID", self.project_id),
+                "bigquery_dataset": config["BIGQUERY_DATASET"],
+                "backfill_start_date": config.get("BACKFILL_START_DATE", "2024-01-01"),
+                "is_active": config.get("is_active", True),
+                "created_at": now,
+                "updated_at": now,
+                "created_by": "migration",
+                "updated_by": "migration",
+            }
+            if config.get("metadata") and isinstance(config["metadata"], dict) and config["metadata"]:
+                row["metadata"] = config["metadata"]
+            rows.append(row)
+
+        if not rows:
+            return 0
+
+        # Single batch load - avoids per-row streaming inserts and the
+        # streaming buffer entirely
+        job_config = bigquery.LoadJobConfig(
+            write_disposition="WRITE_APPEND",
+            schema=self.client.get_table(table_id).schema,
+        )
+        try:
+            self.client.load_table_from_json(rows, table_id, job_config=job_config).result()
+        except Exception as e:
+            print(f"Failed to migrate stores: {e}")
+            return 0
+
+        self._cache.clear()
+        for row in rows:
+            print(f"Migrated store: {row['merchant']}")
+        return len(rows)
\ No newline at end of file
@@ -4,6 +4,7 @@ First-time setup script for Shopify Automated Pipelines
 Run this once to set up your environment
 """
 
+import json
 import os
 import subprocess
 import sys
@@ -44,9 +45,9 @@ def main():
         "cloudscheduler.googleapis.com"
     ]
     
-    print("\n📌 Enabling required APIs...")
-    for api in apis:
-        run_command(f"gcloud services enable {api}", f"Enabling {api}")
+    # One gcloud invocation enables all APIs together - each fork costs
+    # seconds of SDK startup, and the service-usage call batches anyway
+    run_command(f"gcloud services enable {' '.join(apis)}", "Enabling required APIs")
     
     # Step 3: Create service account
     sa_name = "shopify-pipeline-sa"
@@ -67,13 +68,42 @@ def main():
         "roles/cloudscheduler.admin"
     ]
     
+    # Read the policy once, add every missing binding locally, and write
+    # it back in a single set-iam-policy call instead of one
+    # add-iam-policy-binding fork (a full read-modify-write each) per role
     print("\n📌 Granting permissions...")
-    for role in roles:
-        run_command(
-            f'gcloud projects add-iam-policy-binding {project_id} '
-            f'--member="serviceAccount:{sa_email}" --role="{role}"',
-            f"Granting {role}"
-        )
+    result = subprocess.run(
+        f"gcloud projects get-iam-policy {project_id} --format=json",
+        shell=True, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(f"❌ Error reading IAM policy: {result.stderr}")
+    else:
+        policy = json.loads(result.stdout)
+        member = f"serviceAccount:{sa_email}"
+        bindings = policy.setdefault("bindings", [])
+        by_role = {binding["role"]: binding for binding in bindings}
+        changed = False
+        for role in roles:
+            binding = by_role.get(role)
+            if binding is None:
+                bindings.append({"role": role, "members": [member]})
+                changed = True
+            elif member not in binding.get("members", []):
+                binding.setdefault("members", []).append(member)
+                changed = True
+
+        if changed:
+            policy_path = "iam_policy.json"
+            with open(policy_path, "w") as f:
+                json.dump(policy, f)
+            run_command(
+                f"gcloud projects set-iam-policy {project_id} {policy_path}",
+                "Applying IAM bindings"
+            )
+            os.remove(policy_path)
+        else:
+            print("✅ All roles already granted")
     
     # Step 5: Create service account key
     print("\n📌 Creating service account key...")